@@ -0,0 +1,192 @@
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import threading
+from functools import cached_property
+from config import CACHE_DIR, BACKUP_CACHE_ENABLED
+
+try:
+    # Optional: stream only the requested tables instead of materializing the whole document
+    import ijson
+except ImportError:
+    ijson = None
+
+DATABASE_FILE = "database.json"
+# Parsed tables are pickled here, one file per table, keyed by the backup's path/size/mtime
+BACKUP_CACHE_DIR = os.path.join(CACHE_DIR, "backup")
+MANIFEST_FILE = "manifest.json"
+
+_backups: dict[str, "Backup"] = {}
+_backups_lock = threading.Lock()
+
+
+def _group_by_recipe_id(rows: list) -> dict[str, list]:
+    """Group rows by str(recipe_id), keeping their original order within each recipe"""
+    grouped: dict[str, list] = {}
+    for row in rows:
+        grouped.setdefault(str(row.get("recipe_id")), []).append(row)
+    return grouped
+
+
+class Backup:
+    """
+    Lazily parsed view of a Mealie database.json backup.
+
+    The file is parsed once; tables are then served from memory. When `tables`
+    is given only those tables are kept (and, with ijson installed, only those
+    are ever built), which keeps peak memory down on large backups. Asking for
+    a table outside that set triggers one more pass for just that table.
+
+    Parsed tables are also pickled under BACKUP_CACHE_DIR, so later runs (the
+    other restore steps) load just the tables they need without touching JSON.
+    The cache is keyed by path, size and mtime and rebuilt when the file changes.
+    """
+
+    def __init__(self, path: str = DATABASE_FILE, tables=None):
+        self.path = path
+        self._wanted = set(tables) if tables else None
+        self._tables: dict[str, list] = {}
+        self._complete = False
+        self._lock = threading.Lock()
+
+    @property
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def _parse(self, names: set | None) -> dict:
+        if ijson is not None and names is not None:
+            tables = {}
+            with open(self.path, "rb") as file:
+                for key, value in ijson.kvitems(file, "", use_float=True):
+                    if key in names:
+                        tables[key] = value
+            return tables
+
+        with open(self.path, "r", encoding="utf-8") as file:
+            data = json.load(file)
+        if names is None:
+            return data
+        return {key: value for key, value in data.items() if key in names}
+
+    def _cache_dir(self) -> str:
+        stat = os.stat(self.path)
+        key = f"{os.path.abspath(self.path)}:{stat.st_size}:{stat.st_mtime_ns}"
+        return os.path.join(BACKUP_CACHE_DIR, hashlib.sha1(key.encode("utf-8")).hexdigest())
+
+    def _read_cache(self, cache_dir: str, names: set | None) -> dict | None:
+        try:
+            with open(os.path.join(cache_dir, MANIFEST_FILE), "r", encoding="utf-8") as file:
+                available = json.load(file)["tables"]
+            tables = {}
+            for name in available:
+                if names is None or name in names:
+                    with open(os.path.join(cache_dir, f"{name}.pickle"), "rb") as file:
+                        tables[name] = pickle.load(file)
+            return tables
+        except (OSError, ValueError, KeyError, pickle.UnpicklingError, EOFError):
+            return None
+
+    def _write_cache(self, cache_dir: str, data: dict):
+        source = os.path.abspath(self.path)
+        tmp_dir = f"{cache_dir}.tmp-{os.getpid()}"
+        try:
+            # Drop snapshots of older versions of the same backup file
+            if os.path.isdir(BACKUP_CACHE_DIR):
+                for entry in os.listdir(BACKUP_CACHE_DIR):
+                    old_dir = os.path.join(BACKUP_CACHE_DIR, entry)
+                    try:
+                        with open(os.path.join(old_dir, MANIFEST_FILE), "r", encoding="utf-8") as file:
+                            if json.load(file).get("source") == source:
+                                shutil.rmtree(old_dir, ignore_errors=True)
+                    except (OSError, ValueError):
+                        continue
+
+            os.makedirs(tmp_dir, exist_ok=True)
+            tables = [name for name, rows in data.items() if isinstance(rows, list)]
+            for name in tables:
+                with open(os.path.join(tmp_dir, f"{name}.pickle"), "wb") as file:
+                    pickle.dump(data[name], file, protocol=pickle.HIGHEST_PROTOCOL)
+            with open(os.path.join(tmp_dir, MANIFEST_FILE), "w", encoding="utf-8") as file:
+                json.dump({"source": source, "tables": tables}, file)
+            os.replace(tmp_dir, cache_dir)
+        except OSError as e:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            print(f"⚠️ Could not write backup cache: {e}")
+
+    def _read_tables(self, names: set | None) -> dict:
+        if not BACKUP_CACHE_ENABLED:
+            return self._parse(names)
+
+        cache_dir = self._cache_dir()
+        tables = self._read_cache(cache_dir, names)
+        if tables is not None:
+            return tables
+
+        # First run for this backup: parse everything once so later steps can skip JSON entirely
+        print(f"📦 Building backup cache for {self.path}...")
+        data = self._parse(None)
+        self._write_cache(cache_dir, data)
+        if names is None:
+            return data
+        return {key: value for key, value in data.items() if key in names}
+
+    def table(self, name: str) -> list:
+        """Return all rows of a backup table ([] if missing)"""
+        if name in self._tables or self._complete:
+            return self._tables.get(name, [])
+        if not self.exists:
+            raise FileNotFoundError(f"{self.path} not found")
+        with self._lock:
+            if name not in self._tables and not self._complete:
+                if self._wanted is None:
+                    self._tables = self._read_tables(None)
+                    self._complete = True
+                else:
+                    names = (self._wanted | {name}) - self._tables.keys()
+                    self._tables.update(self._read_tables(names))
+                    # Remember the lookup so a missing table is not re-read
+                    self._tables.setdefault(name, [])
+        return self._tables.get(name, [])
+
+    # --- Lazily built indexes ---
+    @cached_property
+    def recipes_by_id(self) -> dict:
+        return {recipe["id"]: recipe for recipe in self.table("recipes")}
+
+    @cached_property
+    def recipes_by_slug(self) -> dict:
+        by_slug = {}
+        for recipe in self.table("recipes"):
+            if "slug" in recipe:
+                by_slug.setdefault(recipe["slug"], recipe)  # first wins on duplicate slugs
+        return by_slug
+
+    @cached_property
+    def users_by_id(self) -> dict:
+        return {user["id"]: user for user in self.table("users")}
+
+    @cached_property
+    def nutrition_by_recipe_id(self) -> dict:
+        return {n["recipe_id"]: n for n in self.table("recipe_nutrition")}
+
+    @cached_property
+    def ingredients_by_recipe_id(self) -> dict[str, list]:
+        return _group_by_recipe_id(self.table("recipes_ingredients"))
+
+    @cached_property
+    def instructions_by_recipe_id(self) -> dict[str, list]:
+        return _group_by_recipe_id(self.table("recipe_instructions"))
+
+
+def load_backup(path: str = DATABASE_FILE, tables=None) -> Backup:
+    """Return the shared Backup for `path`, so every step in a process parses it once"""
+    with _backups_lock:
+        backup = _backups.get(path)
+        if backup is None:
+            backup = Backup(path, tables)
+            _backups[path] = backup
+        elif backup._wanted is not None:
+            backup._wanted = backup._wanted | set(tables) if tables else None
+        return backup
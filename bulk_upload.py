@@ -0,0 +1,91 @@
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import requests
+import http_client
+from mapping_store import get_mapping_store, normalize_name
+from paginator import PaginationError, find_items
+
+DEFAULT_CONCURRENCY = 8
+
+
+def add_concurrency_argument(parser: argparse.ArgumentParser) -> argparse.ArgumentParser:
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help=f"Number of uploads in flight at once (default: {DEFAULT_CONCURRENCY})",
+    )
+    return parser
+
+
+def _post(endpoint: str, payload: dict):
+    """POST one entity; exceptions are returned so they can be reported in order"""
+    try:
+        return http_client.post(endpoint, json=payload)
+    except Exception as e:
+        return e
+
+
+def resolve_new_id(endpoint: str, response, field: str, value, *, limiter=None):
+    """
+    Server ID of an uploaded entity: taken from the 201 body, or looked up by
+    `field` when the entity already existed (409). None if the upload failed.
+    """
+    if isinstance(response, Exception) or response.status_code not in (201, 409):
+        return None
+    if response.status_code == 201:
+        try:
+            body = response.json()
+        except ValueError:
+            body = None
+        if isinstance(body, dict) and body.get("id") is not None:
+            return body["id"]
+    try:
+        matches = find_items(endpoint, field, value, limiter=limiter)
+    except (PaginationError, requests.exceptions.RequestException) as e:
+        print(f"⚠️ Could not look up ID of {value}: {e}")
+        return None
+    for match in matches:
+        if normalize_name(match.get(field)) == normalize_name(value):
+            return match.get("id")
+    return None
+
+
+def upload_entities(items, endpoint, label, build_payload, *, name_of=lambda item: item["name"], concurrency=DEFAULT_CONCURRENCY, on_result=None, record_as=None):
+    """
+    POST every item to `endpoint` with at most `concurrency` requests in flight.
+
+    Results are printed in input order with the same 201/409/error wording the
+    upload scripts have always used. `on_result(item, response)` is called for
+    every completed request (response is an exception on transport errors).
+    With `record_as`, the backup ID and new server ID of every item are stored
+    under that entity in the mapping store as soon as its response arrives.
+    Returns a dict of created/existing/failed counts.
+    """
+    counts = {"created": 0, "existing": 0, "failed": 0}
+    payloads = [build_payload(item) for item in items]
+    store = get_mapping_store() if record_as else None
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        # executor.map yields in submission order, so output matches the serial scripts
+        responses = executor.map(lambda payload: _post(endpoint, payload), payloads)
+        for item, response in zip(items, responses):
+            name = name_of(item)
+            if isinstance(response, Exception):
+                print(f"❌ Failed to add {label}: {name} - {response}")
+                counts["failed"] += 1
+            elif response.status_code == 201:
+                print(f"✔ Successfully added {label}: {name}")
+                counts["created"] += 1
+            elif response.status_code == 409:
+                print(f"⚠ {label.capitalize()} already exists: {name}")
+                counts["existing"] += 1
+            else:
+                print(f"❌ Failed to add {label}: {name} - {response.text}")
+                counts["failed"] += 1
+            if store:
+                store.record(record_as, name, item.get("id"), resolve_new_id(endpoint, response, "name", name))
+            if on_result:
+                on_result(item, response)
+
+    return counts
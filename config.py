@@ -14,10 +14,68 @@ HEADERS = {
 if MEALIE_API_TOKEN:
     HEADERS["Authorization"] = f"Bearer {MEALIE_API_TOKEN}"
 
+# --- HTTP client tuning (shared connection pool, see http_client.py) ---
+REQUEST_TIMEOUT = float(os.getenv("MEALIE_REQUEST_TIMEOUT", "30"))
+MAX_RETRIES = int(os.getenv("MEALIE_MAX_RETRIES", "3"))
+RETRY_BACKOFF = float(os.getenv("MEALIE_RETRY_BACKOFF", "1.0"))
+# Number of per-host pools kept alive, and max open connections per host
+HTTP_POOL_CONNECTIONS = int(os.getenv("MEALIE_POOL_CONNECTIONS", "4"))
+HTTP_POOL_MAXSIZE = int(os.getenv("MEALIE_POOL_MAXSIZE", "16"))
+
+# --- Adaptive rate limiting (requests/second, see rate_limiter.py) ---
+RATE_LIMIT_INITIAL = float(os.getenv("MEALIE_RATE_LIMIT_INITIAL", "2"))
+RATE_LIMIT_MIN = float(os.getenv("MEALIE_RATE_LIMIT_MIN", "0.2"))
+RATE_LIMIT_MAX = float(os.getenv("MEALIE_RATE_LIMIT_MAX", "50"))
+# Responses slower than this (seconds) are treated as a sign of server load
+RATE_LIMIT_LATENCY_THRESHOLD = float(os.getenv("MEALIE_RATE_LIMIT_LATENCY", "2.0"))
+
+# --- Pagination of list endpoints (see paginator.py) ---
+PAGE_SIZE = int(os.getenv("MEALIE_PAGE_SIZE", "100"))
+# Pages fetched concurrently once the first page has reported the total
+PAGINATION_WORKERS = int(os.getenv("MEALIE_PAGINATION_WORKERS", "4"))
+
+# --- Local caches (parsed backup snapshots etc.) ---
+CACHE_DIR = os.getenv("RESTORE_CACHE_DIR", ".restore_cache")
+BACKUP_CACHE_ENABLED = os.getenv("BACKUP_CACHE", "true").strip().lower() in ("1", "true", "yes", "y")
+# Persistent cache of OpenRouter ingredient parses (SQLite), bounded by entry count
+PARSER_CACHE_FILE = os.getenv("PARSER_CACHE_FILE", os.path.join(CACHE_DIR, "llm_parser_cache.sqlite"))
+PARSER_CACHE_MAX_ENTRIES = int(os.getenv("PARSER_CACHE_MAX_ENTRIES", "200000"))
+# Local SQLite snapshot of recipes/foods/units/... on the server, refreshed incrementally
+SNAPSHOT_FILE = os.getenv("SNAPSHOT_FILE", os.path.join(CACHE_DIR, "mealie_snapshot.sqlite"))
+# Skip even the incremental refresh when the snapshot is younger than this (seconds)
+SNAPSHOT_MAX_AGE = float(os.getenv("SNAPSHOT_MAX_AGE", "0"))
+# List every server ID at least this often (seconds) even when the totals match; 0 = only on a mismatch
+SNAPSHOT_SWEEP_INTERVAL = float(os.getenv("SNAPSHOT_SWEEP_INTERVAL", "86400"))
+# Per-step progress journals for --resume; fsync after this many records or seconds
+JOURNAL_DIR = os.getenv("JOURNAL_DIR", os.path.join(CACHE_DIR, "journal"))
+JOURNAL_FSYNC_EVERY = int(os.getenv("JOURNAL_FSYNC_EVERY", "50"))
+JOURNAL_FSYNC_INTERVAL = float(os.getenv("JOURNAL_FSYNC_INTERVAL", "2.0"))
+# Distinct strings kept by the ingredient name normalizer's LRU cache
+NORMALIZE_CACHE_SIZE = int(os.getenv("NORMALIZE_CACHE_SIZE", "65536"))
+
+# --- ID mappings (see mapping_store.py) ---
+# Backup ID -> new ID of every restored entity; not a cache, it is needed by every update step
+MAPPINGS_DB_FILE = os.getenv("MAPPINGS_DB_FILE", "mappings.sqlite")
+
+# --- Image restore pipeline (upload_recipe_images_robust.py) ---
+# Processes converting WebP -> JPEG, threads uploading, and converted images allowed to wait for an uploader
+IMAGE_CONVERT_WORKERS = int(os.getenv("IMAGE_CONVERT_WORKERS", str(os.cpu_count() or 2)))
+IMAGE_UPLOAD_WORKERS = int(os.getenv("IMAGE_UPLOAD_WORKERS", "4"))
+IMAGE_QUEUE_SIZE = int(os.getenv("IMAGE_QUEUE_SIZE", "16"))
+# Converted JPEGs held in memory at once (0 = only bounded by the queue)
+IMAGE_MAX_BUFFERS = int(os.getenv("IMAGE_MAX_BUFFERS", "32"))
+# Images already uploaded (source/converted hashes), so re-runs skip unchanged recipes
+IMAGE_MANIFEST_FILE = os.getenv("IMAGE_MANIFEST_FILE", os.path.join(CACHE_DIR, "image_manifest.sqlite"))
+
 # --- OpenRouter Configuration (optional) ---
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 OPENROUTER_MODEL = os.getenv("OPENROUTER_MODEL", "openai/gpt-oss-20b:free")
 OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+# Ingredient lines sent per OpenRouter request in batched parsing
+OPENROUTER_BATCH_SIZE = int(os.getenv("OPENROUTER_BATCH_SIZE", "25"))
+# Concurrent OpenRouter requests and overall request budget for the LLM pre-pass
+OPENROUTER_WORKERS = int(os.getenv("OPENROUTER_WORKERS", "4"))
+OPENROUTER_REQUESTS_PER_MINUTE = float(os.getenv("OPENROUTER_REQUESTS_PER_MINUTE", "60"))
 # Optional but recommended metadata for OpenRouter
 OPENROUTER_HTTP_REFERER = os.getenv("OPENROUTER_HTTP_REFERER", "https://github.com/Aesgarth/Mealie-Restore")
 OPENROUTER_X_TITLE = os.getenv("OPENROUTER_X_TITLE", "Mealie Restore")
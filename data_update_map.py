@@ -1,113 +1,89 @@
-﻿import requests
-import json
-import time
-import os
-from config import MEALIE_URL, HEADERS, MEALIE_VERIFY_SSL
-
-# Disable SSL warnings for self-signed certificates only if verification is disabled
-import urllib3
-if not MEALIE_VERIFY_SSL:
-    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+﻿import os
+import argparse
+from backup_loader import load_backup
+from mapping_store import get_mapping_store
+from snapshot_store import get_snapshot, load_entities
+from rate_limiter import AdaptiveRateLimiter
 
 # Define file paths
 DATABASE_FILE = "database.json"
-MAPPINGS_FILE = "mappings.json"
-REQUEST_TIMEOUT = 30
 
-# Load old data from database.json
+# Paces the listing requests instead of a fixed pause between entity types
+RATE_LIMITER = AdaptiveRateLimiter()
+
+# Entities to map: list endpoint under /api and the key their names are stored under
+ENTITIES = [
+    ("recipes", "name"),
+    ("foods", "name"),
+    ("units", "name"),
+    ("organizers/tools", "name"),
+    ("organizers/categories", "name"),
+    ("organizers/tags", "name"),
+    ("admin/users", "username")  # Use username for users
+]
+ENTITY_NAMES = [entity.split("/")[-1] for entity, _ in ENTITIES]
+
+# Backup tables of the entities whose table name differs from the entity name
+BACKUP_TABLES = {"foods": "ingredient_foods", "units": "ingredient_units"}
+
+# Load old data from database.json: (name, old ID) of every backup entity
 def fetch_old_data(entity, key="name"):
     if not os.path.exists(DATABASE_FILE):
         print(f"⚠️ {DATABASE_FILE} not found! Make sure to provide it.")
-        return {}
-    
-    with open(DATABASE_FILE, "r", encoding="utf-8") as file:
-        data = json.load(file)
+        return []
     
-    # Handle different entity structures
-    if entity == "foods":
-        return {item["name"].lower(): {"old_id": item["id"], "new_id": None} for item in data.get("ingredient_foods", []) if "name" in item and "id" in item}
-    elif entity == "units":
-        return {item["name"].lower(): {"old_id": item["id"], "new_id": None} for item in data.get("ingredient_units", []) if "name" in item and "id" in item}
-    elif entity == "tools":
-        return {item["name"].lower(): {"old_id": item["id"], "new_id": None} for item in data.get("tools", []) if "name" in item and "id" in item}
-    elif entity == "categories":
-        return {item["name"].lower(): {"old_id": item["id"], "new_id": None} for item in data.get("categories", []) if "name" in item and "id" in item}
-    elif entity == "tags":
-        return {item["name"].lower(): {"old_id": item["id"], "new_id": None} for item in data.get("tags", []) if "name" in item and "id" in item}
-    elif entity == "users":
-        return {item["username"].lower(): {"old_id": item["id"], "new_id": None} for item in data.get("users", []) if "username" in item and "id" in item}
-    else:
-        return {item[key].lower(): {"old_id": item["id"], "new_id": None} for item in data.get(entity, []) if key in item and "id" in item}
+    # Parsed once per run and shared by every entity type
+    backup = load_backup(DATABASE_FILE)
+    table = BACKUP_TABLES.get(entity, entity)
+    return [(item[key], item["id"]) for item in backup.table(table) if key in item and "id" in item]
 
-# Fetch all recipes and other entities from Mealie and store their names and new IDs
-def fetch_new_data(entity, key="name"):
-    items = {}
-    page = 1
-    per_page = 100
-    
-    while True:
-        url = f"{MEALIE_URL}/api/{entity}?page={page}&perPage={per_page}"
-        print(f"📡 Fetching: {url}")
-        response = requests.get(url, headers=HEADERS, verify=MEALIE_VERIFY_SSL, timeout=REQUEST_TIMEOUT)
-        
-        if response.status_code != 200:
-            print(f"❌ Error fetching {entity}: {response.status_code}")
-            break
-        
-        data = response.json()
-        if "items" in data:
-            for item in data["items"]:
-                if key in item and "id" in item:
-                    items[item[key].lower()] = {"old_id": None, "new_id": item["id"]}
-                else:
-                    print(f"⚠️ Skipping entry in {entity} without '{key}' or 'id': {item}")
+# Fetch all recipes and other entities from Mealie and keep their names, new IDs and slugs
+def fetch_new_data(entity, key="name", since=None):
+    items = []
+    # Read from the local snapshot (entity "organizers/tools" -> "tools", "admin/users" -> "users");
+    # with `since`, only entities created/updated at or after that time
+    for item in load_entities(entity.split("/")[-1], since=since, limiter=RATE_LIMITER):
+        if key in item and "id" in item:
+            items.append({"id": item["id"], "name": item[key], "slug": item.get("slug")})
         else:
-            print(f"⚠️ Unexpected response format for {entity}: {data}")
-            break
-        
-        if not data.get("next"):
-            break
-        page += 1
-    
+            print(f"⚠️ Skipping entry in {entity} without '{key}' or 'id': {item}")
     return items
 
 # Generate mappings for recipes, foods, units, tools, categories, tags, and users
-def generate_mappings():
-    mappings = {}
-    entities = [
-        ("recipes", "name"),
-        ("foods", "name"),
-        ("units", "name"),
-        ("organizers/tools", "name"),
-        ("organizers/categories", "name"),
-        ("organizers/tags", "name"),
-        ("admin/users", "username")  # Use username for users
-    ]
+def generate_mappings(only=None, full=False):
+    store = get_mapping_store()
     
-    for entity, key in entities:
-        old_data = fetch_old_data(entity.split("/")[-1], key)
-        new_data = fetch_new_data(entity, key)
+    for entity, key in ENTITIES:
+        name = entity.split("/")[-1]
+        if only and name not in only:
+            continue
+        old_data = fetch_old_data(name, key)
+        since = None if full else store.synced_until(name)
         
-        # Merge old and new IDs
-        for name, details in old_data.items():
-            if name in new_data:
-                new_data[name]["old_id"] = details["old_id"]
-            else:
-                new_data[name] = details  # Keep old data if no match in new
+        # Every server entity on the first/full run, afterwards only those changed since the last run
+        new_data = fetch_new_data(entity, key, since=since)
+        live_ids = [item["id"] for item in get_snapshot().items(name, ("id",))]
+        # --full drops the stored pairs (including those recorded by the uploads) and pairs by name again
+        merged = store.merge_server_items(name, old_data, new_data, live_ids, replace=full)
+        if since is None:
+            print(f"🔄 Rebuilt {name} mappings from {merged} server entities")
+        else:
+            print(f"🔄 {name}: merged {merged} entities changed since {since}")
         
-        mappings[entity.split("/")[-1]] = new_data
-        time.sleep(1)  # Avoid rate-limiting
+        # Entities without update times have no watermark and are always merged in full
+        store.set_synced_until(name, get_snapshot().synced_until(name))
     
-    # Save mappings to a JSON file
-    with open(MAPPINGS_FILE, "w", encoding="utf-8") as f:
-        json.dump(mappings, f, indent=4)
-    print("✅ Mappings saved to mappings.json")
+    print(f"✅ Mappings saved to {store.path}")
 
 # Main function
-def main():
+def main(only=None, full=False):
     print("🚀 Starting Mealie Data Mapping...")
-    generate_mappings()
+    generate_mappings(only, full)
     print("✅ Mapping complete!")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Map backup IDs to the IDs of the restored entities in Mealie.")
+    parser.add_argument("--only", nargs="+", choices=ENTITY_NAMES, help="Refresh just these entity types and keep the other mappings")
+    parser.add_argument("--full", action="store_true", help="Discard the stored pairs and rebuild them by name from all server entities, instead of merging changes since the last run")
+    args = parser.parse_args()
+    main(args.only, args.full)
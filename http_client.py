@@ -0,0 +1,135 @@
+import threading
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from config import (
+    MEALIE_URL,
+    HEADERS,
+    MEALIE_VERIFY_SSL,
+    REQUEST_TIMEOUT,
+    MAX_RETRIES,
+    RETRY_BACKOFF,
+    HTTP_POOL_CONNECTIONS,
+    HTTP_POOL_MAXSIZE,
+)
+
+# Disable SSL warnings for self-signed certificates only if verification is disabled
+if not MEALIE_VERIFY_SSL:
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+# Transient statuses retried by the adapter (Retry-After is honored for 429/503)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Methods safe to replay automatically. POST (duplicates) and PUT (image uploads
+# stream their body and cannot be replayed) are left to the caller.
+RETRY_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PATCH", "DELETE"})
+# Requests paced by a rate limiter get 429 back from the adapter, so the
+# limiter sees it and slows down; request() then retries them itself. urllib3
+# replays any 429 carrying Retry-After, so that session leaves the header to the limiter.
+PACED_RETRY_STATUSES = tuple(status for status in RETRY_STATUSES if status != 429)
+
+_session: requests.Session | None = None
+_paced_session: requests.Session | None = None
+_session_lock = threading.Lock()
+
+
+def build_session(
+    headers: dict | None = None,
+    *,
+    verify: bool = True,
+    pool_connections: int = HTTP_POOL_CONNECTIONS,
+    pool_maxsize: int = HTTP_POOL_MAXSIZE,
+    max_retries: int = MAX_RETRIES,
+    backoff_factor: float = RETRY_BACKOFF,
+    retry_statuses=RETRY_STATUSES,
+    respect_retry_after: bool = True,
+) -> requests.Session:
+    """Create a keep-alive session with a bounded per-host connection pool"""
+    retry = Retry(
+        total=max_retries,
+        connect=max_retries,
+        read=max_retries,
+        status=max_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=retry_statuses,
+        allowed_methods=RETRY_METHODS,
+        respect_retry_after_header=respect_retry_after,
+        raise_on_status=False,
+    )
+    # pool_block keeps the number of open connections per host at pool_maxsize
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        pool_block=True,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    if headers:
+        session.headers.update(headers)
+    session.verify = verify
+    return session
+
+
+def get_session() -> requests.Session:
+    """Return the process-wide Mealie session (created on first use)"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = build_session(HEADERS, verify=MEALIE_VERIFY_SSL)
+    return _session
+
+
+def get_paced_session() -> requests.Session:
+    """Return the session for rate-limited requests (429 is not retried by the adapter)"""
+    global _paced_session
+    if _paced_session is None:
+        with _session_lock:
+            if _paced_session is None:
+                _paced_session = build_session(
+                    HEADERS, verify=MEALIE_VERIFY_SSL, retry_statuses=PACED_RETRY_STATUSES, respect_retry_after=False
+                )
+    return _paced_session
+
+
+def request(method: str, path: str, *, timeout: float = REQUEST_TIMEOUT, limiter=None, **kwargs) -> requests.Response:
+    """
+    Send a request to Mealie. `path` may be absolute or relative to MEALIE_URL.
+    When a rate_limiter.AdaptiveRateLimiter is given, the call waits for it and
+    reports the outcome back so the limiter can adapt; a 429 then reaches the
+    limiter (which honors Retry-After) and replayable methods are retried
+    through it up to MAX_RETRIES times.
+    """
+    url = path if path.startswith(("http://", "https://")) else f"{MEALIE_URL}{path}"
+    if limiter is None:
+        return get_session().request(method, url, timeout=timeout, **kwargs)
+
+    session = get_paced_session()
+    for attempt in range(MAX_RETRIES + 1):
+        limiter.acquire()
+        try:
+            response = session.request(method, url, timeout=timeout, **kwargs)
+        except requests.exceptions.RequestException:
+            limiter.record(None)
+            raise
+        limiter.record(response)
+        if response.status_code != 429 or method.upper() not in RETRY_METHODS or attempt == MAX_RETRIES:
+            return response
+
+
+def get(path: str, **kwargs) -> requests.Response:
+    return request("GET", path, **kwargs)
+
+
+def post(path: str, **kwargs) -> requests.Response:
+    return request("POST", path, **kwargs)
+
+
+def put(path: str, **kwargs) -> requests.Response:
+    return request("PUT", path, **kwargs)
+
+
+def patch(path: str, **kwargs) -> requests.Response:
+    return request("PATCH", path, **kwargs)
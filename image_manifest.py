@@ -0,0 +1,98 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from config import IMAGE_MANIFEST_FILE
+
+
+def sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ImageManifest:
+    """
+    Record of recipe images already uploaded (slug -> source hash, converted
+    hash, upload time and what the server reported for the image).
+
+    Only successful uploads are recorded, so a re-run after a partial failure
+    only touches the recipes that are missing, were recreated under a new ID
+    (e.g. on a fresh Mealie, usually with the same slug) or whose source
+    image changed.
+    Source files are re-hashed only when their size or mtime changed. Safe to
+    use from several threads.
+    """
+
+    def __init__(self, path: str = IMAGE_MANIFEST_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS images ("
+            " slug TEXT PRIMARY KEY,"
+            " recipe_id TEXT,"
+            " source_path TEXT NOT NULL,"
+            " source_size INTEGER NOT NULL,"
+            " source_mtime_ns INTEGER NOT NULL,"
+            " source_hash TEXT NOT NULL,"
+            " converted_hash TEXT NOT NULL,"
+            " uploaded_at REAL NOT NULL,"
+            " server_etag TEXT,"
+            " server_size INTEGER)"
+        )
+
+    def get(self, slug: str) -> dict | None:
+        with self._lock:
+            cursor = self._conn.execute("SELECT * FROM images WHERE slug = ?", (slug,))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            return dict(zip((column[0] for column in cursor.description), row))
+
+    def is_current(self, slug: str, source_path: str, recipe_id=None) -> bool:
+        """True if `source_path` is the same image that was last uploaded for `slug` (to recipe `recipe_id`)"""
+        entry = self.get(slug)
+        if entry is None:
+            return False
+        if recipe_id is not None and entry["recipe_id"] != str(recipe_id):
+            return False
+        try:
+            stat = os.stat(source_path)
+        except OSError:
+            return False
+        if (entry["source_path"], entry["source_size"], entry["source_mtime_ns"]) == (source_path, stat.st_size, stat.st_mtime_ns):
+            return True
+        # Touched or moved: compare contents, and remember the new stat if they still match
+        if stat.st_size != entry["source_size"] or sha256_file(source_path) != entry["source_hash"]:
+            return False
+        with self._lock:
+            self._conn.execute(
+                "UPDATE images SET source_path = ?, source_mtime_ns = ? WHERE slug = ?",
+                (source_path, stat.st_mtime_ns, slug),
+            )
+        return True
+
+    def record_upload(self, slug: str, recipe_id, source_path: str, source_hash: str, converted_hash: str, server_etag=None, server_size=None):
+        stat = os.stat(source_path)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO images (slug, recipe_id, source_path, source_size, source_mtime_ns, source_hash,"
+                " converted_hash, uploaded_at, server_etag, server_size) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (slug, str(recipe_id) if recipe_id is not None else None, source_path, stat.st_size, stat.st_mtime_ns, source_hash, converted_hash, time.time(), server_etag, server_size),
+            )
+
+    def forget(self, slug: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM images WHERE slug = ?", (slug,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,89 @@
+import threading
+from mapping_store import MappingStore, get_mapping_store, normalize_name
+
+_index: "MappingIndex | None" = None
+_index_lock = threading.Lock()
+
+
+class EntityMapping:
+    """
+    Lookups for one entity type of the mapping store (name -> {old_id, new_id}).
+
+    Every lookup is one indexed query, so nothing is loaded up front. When
+    several entries match, the first one stored wins (entries with a new ID
+    before unmapped ones), which is what the old linear scans returned.
+    """
+
+    def __init__(self, store: MappingStore, entity: str):
+        self.store = store
+        self.entity = entity
+
+    def __len__(self) -> int:
+        return self.store.count(self.entity)
+
+    def items(self):
+        """(name, {old_id, new_id, slug}) for every entry, duplicate names included, mapped entries first"""
+        for name, old_id, new_id, slug in self.store.rows(self.entity):
+            yield name, {"old_id": old_id, "new_id": new_id, "slug": slug}
+
+    def _find(self, column: str, value) -> tuple | None:
+        return self.store.find(self.entity, column, value)
+
+    def get(self, name: str) -> dict | None:
+        """Mapping entry for a (case-insensitive) name"""
+        found = self._find("norm_name", normalize_name(name))
+        return {"old_id": found[1], "new_id": found[2], "slug": found[3]} if found else None
+
+    def new_id_for(self, old_id) -> str | None:
+        if old_id is None:
+            return None
+        found = self._find("old_id", str(old_id))
+        return found[2] if found else None
+
+    def old_id_for(self, new_id) -> str | None:
+        if new_id is None:
+            return None
+        found = self._find("new_id", str(new_id))
+        return found[1] if found else None
+
+    def name_for_old_id(self, old_id) -> str | None:
+        if old_id is None:
+            return None
+        found = self._find("old_id", str(old_id))
+        return found[0] if found else None
+
+
+class MappingIndex:
+    """All entity mappings of the mapping store"""
+
+    def __init__(self, store: MappingStore):
+        self.store = store
+        self._entities: dict[str, EntityMapping] = {}
+
+    def __contains__(self, entity: str) -> bool:
+        return self.store.count(entity) > 0
+
+    def __getitem__(self, entity: str) -> EntityMapping:
+        mapping = self._entities.get(entity)
+        if mapping is None:
+            mapping = EntityMapping(self.store, entity)
+            self._entities[entity] = mapping
+        return mapping
+
+
+def load_mapping_index() -> MappingIndex:
+    """
+    The process-wide MappingIndex over the mapping store (see mapping_store),
+    shared by every step run together in restore.py.
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = MappingIndex(get_mapping_store())
+    return _index
+
+
+def mappings_available() -> bool:
+    """True once any ID mappings were stored (by the uploads or data_update_map.py)"""
+    return get_mapping_store().count() > 0
@@ -0,0 +1,329 @@
+import argparse
+import json
+import os
+import sqlite3
+import threading
+from config import MAPPINGS_DB_FILE
+
+# Legacy/exported mappings file: {entity: {lowercased name: {old_id, new_id[, slug]}}}
+MAPPINGS_JSON_FILE = "mappings.json"
+# mappings.json keys that are not entity tables of that shape
+SYNC_KEY = "_sync"
+HOUSEHOLDS_KEY = "households"  # {old_id: new_id}, maintained by hand
+
+# Rows read per query when iterating a whole entity
+ROW_CHUNK = 1000
+
+_store: "MappingStore | None" = None
+_store_lock = threading.Lock()
+
+
+def normalize_name(name: str | None) -> str:
+    return (name or "").strip().lower()
+
+
+def _id(value) -> str | None:
+    return str(value) if value is not None else None
+
+
+class MappingStore:
+    """
+    Backup ID -> new server ID pairs of every restored entity, in SQLite.
+
+    One row per pairing (entity, name, normalized name, old_id, new_id and the
+    recipe slug), indexed on old_id, new_id and normalized name, so lookups
+    never load a whole entity and entities sharing a name each keep their own
+    row. Rows are written as they are learned (uploads, mapping crawls) and
+    `sync_state` keeps the server update time the last crawl covered. Safe to
+    use from several threads.
+    """
+
+    def __init__(self, path: str = MAPPINGS_DB_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS mappings ("
+            " entity TEXT NOT NULL,"
+            " name TEXT NOT NULL,"
+            " norm_name TEXT NOT NULL,"
+            " old_id TEXT,"
+            " new_id TEXT,"
+            " slug TEXT)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS mappings_old_id ON mappings (entity, old_id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS mappings_new_id ON mappings (entity, new_id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS mappings_norm_name ON mappings (entity, norm_name)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sync_state ("
+            " entity TEXT PRIMARY KEY,"
+            " synced_until TEXT)"
+        )
+
+    # --- Writes ---
+
+    def _upsert(self, entity: str, name: str, old_id, new_id, slug=None):
+        """Insert or update the row of `old_id` (or `new_id` without one); None keeps a known value (crawl path)"""
+        old_id, new_id = _id(old_id), _id(new_id)
+        key_column, key = ("old_id", old_id) if old_id is not None else ("new_id", new_id)
+        cursor = self._conn.execute(
+            f"UPDATE mappings SET name = ?, norm_name = ?, new_id = COALESCE(?, new_id), slug = COALESCE(?, slug)"
+            f" WHERE entity = ? AND {key_column} = ?",
+            (name, normalize_name(name), new_id, slug, entity, key),
+        )
+        if cursor.rowcount == 0:
+            self._conn.execute(
+                "INSERT INTO mappings (entity, name, norm_name, old_id, new_id, slug) VALUES (?, ?, ?, ?, ?, ?)",
+                (entity, name, normalize_name(name), old_id, new_id, slug),
+            )
+
+    def record(self, entity: str, name: str, old_id, new_id, slug=None):
+        """
+        Store one pairing learned from an upload. new_id None means the upload
+        failed: any new ID/slug kept for `old_id` (e.g. from a previous server)
+        is cleared, so later steps do not target an entity that is not there.
+        """
+        if old_id is None and new_id is None:
+            return
+        with self._lock:
+            if new_id is None:
+                self._conn.execute(
+                    "UPDATE mappings SET new_id = NULL, slug = NULL WHERE entity = ? AND old_id = ?",
+                    (entity, _id(old_id)),
+                )
+            self._upsert(entity, name, old_id, new_id, slug)
+
+    def merge_server_items(self, entity: str, backup_items, server_items, live_ids=None, *, replace: bool = False) -> int:
+        """
+        Pair backup entities (name, old_id) with server entities ({id, name,
+        slug}) by normalized name and store the result; returns the number of
+        server items merged.
+
+        Known pairs are kept while their server entity still exists; with
+        `live_ids` (every server ID of the entity), pairs whose entity is gone
+        lose their new ID. Backup entities without a pair are matched to
+        server entities of the same name in file order, so duplicate names
+        pair up one to one instead of overwriting each other. With `replace`
+        the entity's rows are dropped first (in the same transaction), so
+        every pair is rebuilt from names.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                if replace:
+                    self._conn.execute("DELETE FROM mappings WHERE entity = ?", (entity,))
+                self._conn.executemany(
+                    "INSERT INTO mappings (entity, name, norm_name, old_id) SELECT ?, ?, ?, ?"
+                    " WHERE NOT EXISTS (SELECT 1 FROM mappings WHERE entity = ? AND old_id = ?)",
+                    [(entity, name, normalize_name(name), _id(old_id), entity, _id(old_id)) for name, old_id in backup_items],
+                )
+                if live_ids is not None:
+                    live_ids = {str(new_id) for new_id in live_ids}
+                    gone = [
+                        (rowid, old_id)
+                        for rowid, new_id, old_id in self._conn.execute(
+                            "SELECT rowid, new_id, old_id FROM mappings WHERE entity = ? AND new_id IS NOT NULL", (entity,)
+                        )
+                        if new_id not in live_ids
+                    ]
+                    self._conn.executemany("DELETE FROM mappings WHERE rowid = ?", [(rowid,) for rowid, old_id in gone if old_id is None])
+                    self._conn.executemany(
+                        "UPDATE mappings SET new_id = NULL, slug = NULL WHERE rowid = ?",
+                        [(rowid,) for rowid, old_id in gone if old_id is not None],
+                    )
+                merged = 0
+                for item in server_items:
+                    name, new_id, slug = item["name"], _id(item["id"]), item.get("slug")
+                    norm = normalize_name(name)
+                    cursor = self._conn.execute(
+                        "UPDATE mappings SET name = ?, norm_name = ?, slug = ? WHERE entity = ? AND new_id = ?",
+                        (name, norm, slug, entity, new_id),
+                    )
+                    if cursor.rowcount == 0:
+                        cursor = self._conn.execute(
+                            "UPDATE mappings SET new_id = ?, slug = ? WHERE rowid = ("
+                            " SELECT rowid FROM mappings WHERE entity = ? AND norm_name = ?"
+                            " AND new_id IS NULL AND old_id IS NOT NULL ORDER BY rowid LIMIT 1)",
+                            (new_id, slug, entity, norm),
+                        )
+                    if cursor.rowcount == 0:
+                        self._upsert(entity, name, None, new_id, slug)
+                    merged += 1
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return merged
+
+    def replace_entity(self, entity: str, rows):
+        """Replace all rows of `entity` with (name, old_id, new_id, slug) tuples"""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute("DELETE FROM mappings WHERE entity = ?", (entity,))
+                self._conn.executemany(
+                    "INSERT INTO mappings (entity, name, norm_name, old_id, new_id, slug) VALUES (?, ?, ?, ?, ?, ?)",
+                    [(entity, name, normalize_name(name), _id(old_id), _id(new_id), slug) for name, old_id, new_id, slug in rows],
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def set_synced_until(self, entity: str, synced_until: str | None):
+        with self._lock:
+            if synced_until is None:
+                self._conn.execute("DELETE FROM sync_state WHERE entity = ?", (entity,))
+            else:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO sync_state (entity, synced_until) VALUES (?, ?)", (entity, synced_until)
+                )
+
+    # --- Reads ---
+
+    def synced_until(self, entity: str) -> str | None:
+        with self._lock:
+            row = self._conn.execute("SELECT synced_until FROM sync_state WHERE entity = ?", (entity,)).fetchone()
+        return row[0] if row else None
+
+    def entities(self) -> list[str]:
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT DISTINCT entity FROM mappings ORDER BY entity")]
+
+    def count(self, entity: str | None = None) -> int:
+        with self._lock:
+            if entity is None:
+                return self._conn.execute("SELECT COUNT(*) FROM mappings").fetchone()[0]
+            return self._conn.execute("SELECT COUNT(*) FROM mappings WHERE entity = ?", (entity,)).fetchone()[0]
+
+    def find(self, entity: str, column: str, value) -> tuple | None:
+        """
+        First (name, old_id, new_id, slug) row whose `column` (old_id, new_id
+        or norm_name) equals `value`; rows with a new ID win over unmapped ones.
+        """
+        if column not in ("old_id", "new_id", "norm_name"):
+            raise ValueError(f"not an indexed column: {column}")
+        with self._lock:
+            return self._conn.execute(
+                f"SELECT name, old_id, new_id, slug FROM mappings WHERE entity = ? AND {column} = ?"
+                " ORDER BY new_id IS NULL, rowid LIMIT 1",
+                (entity, value),
+            ).fetchone()
+
+    def rows(self, entity: str):
+        """
+        Yield every (name, old_id, new_id, slug) row of `entity` a chunk at a
+        time, in the order find() prefers them: rows with a new ID first, each
+        group in insertion order.
+        """
+        for mapped in ("new_id IS NOT NULL", "new_id IS NULL"):
+            last = 0
+            while True:
+                with self._lock:
+                    # "+entity" keeps SQLite on a rowid range scan instead of sorting the entity's index hits per chunk
+                    chunk = self._conn.execute(
+                        "SELECT rowid, name, old_id, new_id, slug FROM mappings"
+                        f" WHERE +entity = ? AND {mapped} AND rowid > ? ORDER BY rowid LIMIT ?",
+                        (entity, last, ROW_CHUNK),
+                    ).fetchall()
+                if not chunk:
+                    break
+                for row in chunk:
+                    yield row[1:]
+                last = chunk[-1][0]
+
+    # --- mappings.json compatibility ---
+
+    def import_json(self, path: str = MAPPINGS_JSON_FILE) -> int:
+        """Replace the entities found in a mappings.json file with its contents; returns the rows imported"""
+        with open(path, "r", encoding="utf-8") as file:
+            raw = json.load(file)
+        imported = 0
+        for entity, entries in raw.items():
+            if entity == SYNC_KEY:
+                for synced_entity, synced_until in entries.items():
+                    self.set_synced_until(synced_entity, synced_until)
+                continue
+            if entity == HOUSEHOLDS_KEY:
+                rows = [(old_id, old_id, new_id, None) for old_id, new_id in entries.items()]
+            else:
+                rows = [(name, meta.get("old_id"), meta.get("new_id"), meta.get("slug")) for name, meta in entries.items()]
+            self.replace_entity(entity, rows)
+            imported += len(rows)
+        return imported
+
+    def export_json(self, path: str = MAPPINGS_JSON_FILE) -> int:
+        """
+        Write the store in the mappings.json layout (compact, no indentation);
+        returns the entries written. That layout is keyed by name, so of
+        several entities sharing a name only one is exported.
+        """
+        raw = {}
+        written = 0
+        for entity in self.entities():
+            entries = raw[entity] = {}
+            for name, old_id, new_id, slug in self.rows(entity):
+                if entity == HOUSEHOLDS_KEY:
+                    entries.setdefault(old_id, new_id)
+                    continue
+                key = normalize_name(name)
+                if key in entries:
+                    continue  # rows() yields the entry find() would pick first
+                written += 1
+                entries[key] = {"old_id": old_id, "new_id": new_id}
+                if slug:
+                    entries[key]["slug"] = slug
+        with self._lock:
+            sync = dict(self._conn.execute("SELECT entity, synced_until FROM sync_state").fetchall())
+        if sync:
+            raw[SYNC_KEY] = sync
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(raw, file, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+        return written
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def get_mapping_store() -> MappingStore:
+    """
+    Return the process-wide mapping store (opened on first use). A new, empty
+    store is filled from an existing mappings.json once.
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                store = MappingStore()
+                if store.count() == 0 and os.path.exists(MAPPINGS_JSON_FILE):
+                    imported = store.import_json(MAPPINGS_JSON_FILE)
+                    print(f"📥 Imported {imported} mappings from {MAPPINGS_JSON_FILE} into {store.path}")
+                _store = store
+    return _store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import or export the ID mapping store as mappings.json.")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--export", nargs="?", const=MAPPINGS_JSON_FILE, metavar="FILE", help=f"Write the mappings as JSON (default: {MAPPINGS_JSON_FILE})")
+    group.add_argument("--import", dest="import_file", nargs="?", const=MAPPINGS_JSON_FILE, metavar="FILE", help=f"Load a mappings JSON file, replacing the entities it contains (default: {MAPPINGS_JSON_FILE})")
+    args = parser.parse_args()
+
+    store = get_mapping_store()
+    if args.export:
+        written = store.export_json(args.export)
+        print(f"✅ Exported {written} mappings to {args.export}")
+    else:
+        imported = store.import_json(args.import_file)
+        print(f"✅ Imported {imported} mappings from {args.import_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import requests
+import http_client
+from config import PAGE_SIZE, PAGINATION_WORKERS
+
+
+class PaginationError(Exception):
+    """A page of a Mealie list endpoint could not be fetched"""
+
+
+def _fetch_page(path: str, page: int, per_page: int, params: dict | None, limiter) -> dict:
+    query = dict(params or {})
+    query.update(page=page, perPage=per_page)
+    response = http_client.get(path, params=query, limiter=limiter)
+    if response.status_code != 200:
+        raise PaginationError(f"page {page}: {response.status_code} {response.text}")
+    try:
+        return response.json()
+    except ValueError:
+        raise PaginationError(f"page {page}: response is not valid JSON")
+
+
+def _total_pages(data: dict) -> int | None:
+    # Mealie answers in snake_case; accept camelCase too
+    total_pages = data.get("total_pages", data.get("totalPages"))
+    return int(total_pages) if total_pages is not None else None
+
+
+def _report_failure(label: str, error: Exception, raise_errors: bool):
+    if raise_errors:
+        raise PaginationError(f"{label}: {error}") from error
+    print(f"❌ Failed to fetch {label}: {error}")
+
+
+def iter_pages(path, *, per_page=PAGE_SIZE, workers=PAGINATION_WORKERS, params=None, limiter=None, label=None, raise_errors=False):
+    """
+    Yield the item list of every page of a Mealie list endpoint, in page order.
+
+    The first page is fetched alone to learn total_pages; the remaining pages
+    are fetched by up to `workers` threads in a sliding window, so at most
+    `workers` pages are held ahead of the consumer. Without a page count the
+    pages are walked one by one until `next` is empty.
+
+    Like the per-script loops it replaces, a failed page is reported and ends
+    the iteration (pages before it have already been yielded). With
+    `raise_errors` the failure is raised as PaginationError instead, for
+    callers that must not mistake a partial listing for a complete one.
+    """
+    label = label or path
+    try:
+        data = _fetch_page(path, 1, per_page, params, limiter)
+    except (PaginationError, requests.exceptions.RequestException) as e:
+        _report_failure(label, e, raise_errors)
+        return
+
+    total_pages = _total_pages(data)
+    print(f"🔄 Fetching {label}: Page 1/{total_pages or '?'}")
+    yield data.get("items", [])
+
+    if total_pages is None:
+        # Fallback for endpoints that do not report a page count
+        page = 1
+        while data.get("next") and data.get("items"):
+            page += 1
+            try:
+                data = _fetch_page(path, page, per_page, params, limiter)
+            except (PaginationError, requests.exceptions.RequestException) as e:
+                _report_failure(label, e, raise_errors)
+                return
+            print(f"🔄 Fetching {label}: Page {page}")
+            yield data.get("items", [])
+        return
+
+    if total_pages <= 1:
+        return
+
+    executor = ThreadPoolExecutor(max_workers=max(1, workers))
+    try:
+        pages = iter(range(2, total_pages + 1))
+        window = deque()
+        for page in pages:
+            window.append((page, executor.submit(_fetch_page, path, page, per_page, params, limiter)))
+            if len(window) >= max(1, workers):
+                break
+        while window:
+            page, future = window.popleft()
+            try:
+                data = future.result()
+            except (PaginationError, requests.exceptions.RequestException) as e:
+                _report_failure(label, e, raise_errors)
+                return
+            # Refill the window before handing the page to the consumer
+            next_page = next(pages, None)
+            if next_page is not None:
+                window.append((next_page, executor.submit(_fetch_page, path, next_page, per_page, params, limiter)))
+            print(f"🔄 Fetching {label}: Page {page}/{total_pages}")
+            yield data.get("items", [])
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def count_items(path, *, params=None, limiter=None) -> int | None:
+    """Total number of items a list endpoint reports (None if it does not say)"""
+    total = _fetch_page(path, 1, 1, params, limiter).get("total")
+    return int(total) if total is not None else None
+
+
+def iter_items(path, *, fields=None, **kwargs):
+    """
+    Yield every item of a Mealie list endpoint in order (see iter_pages).
+    With `fields`, each item is cut down to just those keys so callers that
+    keep the results do not hold on to full summaries.
+    """
+    for items in iter_pages(path, **kwargs):
+        if fields is None:
+            yield from items
+        else:
+            for item in items:
+                yield {field: item.get(field) for field in fields}
+
+
+def find_items(path, field: str, value, *, limiter=None) -> list:
+    """Items of a list endpoint whose `field` equals `value` (one filtered page instead of a full listing)"""
+    quoted = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    params = {"queryFilter": f'{field} = "{quoted}"'}
+    return _fetch_page(path, 1, PAGE_SIZE, params, limiter).get("items", [])
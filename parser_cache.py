@@ -0,0 +1,89 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from config import PARSER_CACHE_FILE, PARSER_CACHE_MAX_ENTRIES
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace and case so trivially different lines share a cache entry"""
+    return " ".join((text or "").split()).lower()
+
+
+class ParserCache:
+    """
+    Persistent cache of LLM ingredient parses.
+
+    Entries are keyed by normalized text + model + prompt version, so changing
+    the model or the prompt never serves stale parses. When the cache grows
+    beyond `max_entries` the least recently used 10% are evicted. Safe to use
+    from several threads.
+    """
+
+    def __init__(self, path: str = PARSER_CACHE_FILE, max_entries: int = PARSER_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS parses ("
+            " key TEXT PRIMARY KEY,"
+            " text TEXT NOT NULL,"
+            " model TEXT NOT NULL,"
+            " prompt_version TEXT NOT NULL,"
+            " value TEXT NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS parses_last_used ON parses (last_used)")
+        self._size = self._conn.execute("SELECT COUNT(*) FROM parses").fetchone()[0]
+
+    @staticmethod
+    def _key(text: str, model: str, prompt_version: str) -> str:
+        raw = "\x1f".join((normalize_text(text), model, prompt_version))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, text: str, model: str, prompt_version: str) -> dict | None:
+        key = self._key(text, model, prompt_version)
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM parses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE parses SET last_used = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, text: str, model: str, prompt_version: str, value: dict):
+        key = self._key(text, model, prompt_version)
+        with self._lock:
+            existed = self._conn.execute("SELECT 1 FROM parses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO parses (key, text, model, prompt_version, value, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, normalize_text(text), model, prompt_version, json.dumps(value, ensure_ascii=False), time.time()),
+            )
+            if not existed:
+                self._size += 1
+            if self.max_entries and self._size > self.max_entries:
+                evict = self._size - int(self.max_entries * 0.9)
+                self._conn.execute(
+                    "DELETE FROM parses WHERE key IN (SELECT key FROM parses ORDER BY last_used LIMIT ?)",
+                    (evict,),
+                )
+                self.evictions += evict
+                self._size -= evict
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "entries": self._size}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
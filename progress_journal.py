@@ -0,0 +1,97 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from config import JOURNAL_DIR, JOURNAL_FSYNC_EVERY, JOURNAL_FSYNC_INTERVAL
+
+
+def payload_hash(payload) -> str:
+    """Stable hash of a JSON-serializable payload (key order does not matter)"""
+    raw = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ProgressJournal:
+    """
+    Append-only progress log of one restore step (one JSON line per finished item).
+
+    Each line records the item key (usually the recipe slug), its status and
+    the hash of the payload that was sent. Writes are flushed right away and
+    fsynced every `fsync_every` records or `fsync_interval` seconds, so a
+    crash loses at most that much progress. On load the last record per key
+    wins and a torn final line is ignored. With `resume=False` the previous
+    journal is discarded and the step starts over. Safe to use from several
+    threads.
+    """
+
+    def __init__(self, step: str, *, resume: bool = False, directory: str = JOURNAL_DIR,
+                 fsync_every: int = JOURNAL_FSYNC_EVERY, fsync_interval: float = JOURNAL_FSYNC_INTERVAL):
+        self.step = step
+        self.path = os.path.join(directory, f"{step}.jsonl")
+        self.fsync_every = max(1, fsync_every)
+        self.fsync_interval = fsync_interval
+        self.entries: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        os.makedirs(directory, exist_ok=True)
+        if resume:
+            self._load()
+        self._file = open(self.path, "a" if resume else "w", encoding="utf-8")
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as file:
+            data = file.read()
+        for line in data.splitlines():
+            try:
+                entry = json.loads(line)
+                self.entries[entry["key"]] = entry
+            except (ValueError, KeyError, TypeError):
+                continue
+        if data and not data.endswith(b"\n"):
+            # Cut off a record torn by a crash so new records start on a fresh line
+            with open(self.path, "r+b") as file:
+                file.truncate(data.rfind(b"\n") + 1)
+
+    def is_done(self, key: str, expected_hash: str | None = None) -> bool:
+        """True if `key` completed earlier (with the same payload hash, when one is given)"""
+        entry = self.entries.get(key)
+        if entry is None or entry.get("status") != "done":
+            return False
+        return expected_hash is None or entry.get("hash") == expected_hash
+
+    def done_count(self) -> int:
+        return sum(1 for entry in self.entries.values() if entry.get("status") == "done")
+
+    def record(self, key: str, status: str, hash_: str | None = None):
+        entry = {"key": key, "status": status, "hash": hash_, "at": time.time()}
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            self.entries[key] = entry
+            self._file.write(line)
+            self._file.flush()
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync()
+
+    def _sync(self):
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            if self._file.closed:
+                return
+            if self._unsynced:
+                self._sync()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
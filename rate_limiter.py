@@ -0,0 +1,97 @@
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from config import (
+    RATE_LIMIT_INITIAL,
+    RATE_LIMIT_MIN,
+    RATE_LIMIT_MAX,
+    RATE_LIMIT_LATENCY_THRESHOLD,
+)
+
+
+def _retry_after_seconds(response) -> float | None:
+    """Parse a Retry-After header (delta seconds or HTTP date)"""
+    if response is None:
+        return None
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket whose refill rate (requests/second) follows AIMD.
+
+    Fast 2xx/3xx responses add `increase` to the rate; 429, 5xx, transport
+    errors and responses slower than `latency_threshold` multiply it by
+    `decrease`. A Retry-After header pauses all callers until it expires.
+    Thread-safe, so one limiter can be shared by concurrent workers.
+    """
+
+    def __init__(
+        self,
+        rate: float = RATE_LIMIT_INITIAL,
+        *,
+        min_rate: float = RATE_LIMIT_MIN,
+        max_rate: float = RATE_LIMIT_MAX,
+        increase: float = 0.5,
+        decrease: float = 0.5,
+        latency_threshold: float = RATE_LIMIT_LATENCY_THRESHOLD,
+        burst: float = 1.0,
+    ):
+        if rate <= 0 or min_rate <= 0:
+            raise ValueError(f"rate limits must be positive (rate={rate}, min_rate={min_rate})")
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.rate = min(max(rate, min_rate), max_rate)
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_threshold = latency_threshold
+        self.burst = burst
+        self._tokens = burst
+        self._last_refill = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def acquire(self):
+        """Block until a request may be sent"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self._blocked_until - now
+                if wait <= 0:
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def record(self, response=None, *, latency: float | None = None):
+        """Adjust the rate from a response (None means the request failed in transport)"""
+        if latency is None and response is not None and response.elapsed is not None:
+            latency = response.elapsed.total_seconds()
+        status = response.status_code if response is not None else None
+
+        with self._lock:
+            slow = latency is not None and latency > self.latency_threshold
+            if status is None or status == 429 or status >= 500 or slow:
+                self.rate = max(self.min_rate, self.rate * self.decrease)
+                retry_after = _retry_after_seconds(response)
+                if retry_after:
+                    self._blocked_until = max(self._blocked_until, time.monotonic() + retry_after)
+            elif status < 400:
+                self.rate = min(self.max_rate, self.rate + self.increase)
+            # Other 4xx (e.g. 404, 409) say nothing about server load
@@ -0,0 +1,189 @@
+import argparse
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from backup_loader import DATABASE_FILE, load_backup
+from bulk_upload import DEFAULT_CONCURRENCY
+from config import IMAGE_CONVERT_WORKERS, IMAGE_UPLOAD_WORKERS, OPENROUTER_WORKERS
+
+UPLOAD_STAGES = ("categories", "foods", "units", "tools", "tags", "recipes")
+
+# Restore steps and the steps they depend on. Steps whose dependencies are done
+# run concurrently: the organizer/food/unit uploads and recipe creation all
+# start together, and images upload alongside instructions -> ingredients ->
+# details. The three recipe updates PATCH the same recipes, so they stay serial.
+# Dependencies on stages that are not selected count as done.
+STAGES = {
+    **{name: () for name in UPLOAD_STAGES},
+    "users": (),
+    "mappings": UPLOAD_STAGES + ("users",),
+    "images": ("recipes", "mappings"),
+    "instructions": ("recipes", "mappings"),
+    "ingredients": ("instructions", "foods", "units"),
+    "details": ("ingredients", "users"),
+}
+# Stages left out unless named with --only/--with: creating Mealie accounts
+# (backup admin flags, shared default password) must be asked for, and the
+# uploads store the new IDs in the mapping store as they create entities, so
+# the full mapping crawl is only needed on request
+OPTIONAL_STAGES = ("users", "mappings")
+
+
+def stage_runners(args) -> dict:
+    """Callables for every stage; step modules are imported on first use"""
+    def categories():
+        import upload_categories
+        upload_categories.main(args.concurrency)
+
+    def foods():
+        import upload_ingredients
+        upload_ingredients.main(args.concurrency)
+
+    def units():
+        import upload_units
+        upload_units.main(args.concurrency)
+
+    def tools():
+        import upload_tools
+        upload_tools.main(args.concurrency)
+
+    def tags():
+        import upload_tags
+        upload_tags.main(args.concurrency)
+
+    def users():
+        import upload_users
+        upload_users.main()
+
+    def recipes():
+        import upload_recipes
+        upload_recipes.main()
+
+    def mappings():
+        import data_update_map
+        data_update_map.main()
+
+    def images():
+        import upload_recipe_images_robust
+        upload_recipe_images_robust.main(args.convert_workers, args.upload_workers, resume=args.resume)
+
+    def instructions():
+        import update_recipe_instructions
+        update_recipe_instructions.main(resume=args.resume)
+
+    def ingredients():
+        import update_recipe_ingredients
+        update_recipe_ingredients.process_recipe_updates(llm_workers=args.llm_workers, resume=args.resume)
+
+    def details():
+        import update_recipes
+        update_recipes.main()
+
+    return {
+        "categories": categories,
+        "foods": foods,
+        "units": units,
+        "tools": tools,
+        "tags": tags,
+        "users": users,
+        "recipes": recipes,
+        "mappings": mappings,
+        "images": images,
+        "instructions": instructions,
+        "ingredients": ingredients,
+        "details": details,
+    }
+
+
+def _run_stage(name: str, runner) -> float:
+    """Run one stage; returns its duration. SystemExit from a step script counts as failure"""
+    started = time.monotonic()
+    print(f"▶️ Stage started: {name}")
+    try:
+        runner()
+    except SystemExit as e:
+        raise RuntimeError(f"{name} exited with status {e.code}") from e
+    return time.monotonic() - started
+
+
+def run_stages(selected: list[str], runners: dict) -> dict[str, str]:
+    """
+    Run the selected stages in dependency order, each as soon as its
+    dependencies have finished. Dependencies outside the selection are
+    assumed to be done already. When a stage fails, everything depending
+    on it is skipped. Returns {stage: "done" | "failed" | "skipped"}.
+    """
+    status: dict[str, str] = {}
+    running = {}
+    with ThreadPoolExecutor(max_workers=len(selected) or 1) as executor:
+        while True:
+            for name in selected:
+                if name in status or name in running.values():
+                    continue
+                deps = [dep for dep in STAGES[name] if dep in selected]
+                if any(status.get(dep) in ("failed", "skipped") for dep in deps):
+                    status[name] = "skipped"
+                    print(f"⏭️ Stage skipped: {name} (a dependency failed)")
+                elif all(status.get(dep) == "done" for dep in deps):
+                    running[executor.submit(_run_stage, name, runners[name])] = name
+
+            if not running:
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                try:
+                    duration = future.result()
+                    status[name] = "done"
+                    print(f"✅ Stage finished: {name} ({duration:.1f}s)")
+                except Exception as e:
+                    status[name] = "failed"
+                    print(f"❌ Stage failed: {name} - {e}")
+    return status
+
+
+def select_stages(only=None, skip=None, include=None) -> list[str]:
+    selected = [
+        name for name in STAGES
+        if (name in only if only else name not in OPTIONAL_STAGES or name in (include or ()))
+    ]
+    return [name for name in selected if not skip or name not in skip]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the full Mealie restore as one pipeline.")
+    parser.add_argument("--only", nargs="+", choices=list(STAGES), help="Run just these stages (their dependencies are assumed done)")
+    parser.add_argument("--skip", nargs="+", choices=list(STAGES), help="Leave out these stages")
+    parser.add_argument("--with", dest="include", nargs="+", choices=list(OPTIONAL_STAGES), help="Also run these optional stages (users, mappings)")
+    parser.add_argument("--list", action="store_true", help="Print the stages and their dependencies, then exit")
+    parser.add_argument("--resume", action="store_true", help="Resume images, instructions and ingredients from their progress journals")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help=f"Uploads in flight per organizer/food/unit stage (default: {DEFAULT_CONCURRENCY})")
+    parser.add_argument("--llm-workers", type=int, default=OPENROUTER_WORKERS, help=f"Concurrent OpenRouter requests (default: {OPENROUTER_WORKERS})")
+    parser.add_argument("--convert-workers", type=int, default=IMAGE_CONVERT_WORKERS, help=f"Image conversion processes (default: {IMAGE_CONVERT_WORKERS})")
+    parser.add_argument("--upload-workers", type=int, default=IMAGE_UPLOAD_WORKERS, help=f"Concurrent image uploads (default: {IMAGE_UPLOAD_WORKERS})")
+    args = parser.parse_args()
+
+    if args.list:
+        for name, deps in STAGES.items():
+            optional = " (optional)" if name in OPTIONAL_STAGES else ""
+            print(f"{name}{optional}: {', '.join(deps) if deps else '-'}")
+        return
+
+    selected = select_stages(args.only, args.skip, args.include)
+    print(f"🚀 Restoring stages: {', '.join(selected)}")
+
+    # One Backup for every stage: the first table access parses all tables once
+    load_backup(DATABASE_FILE)
+
+    started = time.monotonic()
+    status = run_stages(selected, stage_runners(args))
+
+    print(f"\n🎉 Restore finished in {time.monotonic() - started:.1f}s")
+    for name in selected:
+        icon = {"done": "✅", "failed": "❌", "skipped": "⏭️"}[status[name]]
+        print(f"{icon} {name}: {status[name]}")
+    if any(state != "done" for state in status.values()):
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
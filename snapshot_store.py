@@ -0,0 +1,285 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import requests
+from config import MEALIE_URL, SNAPSHOT_FILE, SNAPSHOT_MAX_AGE, SNAPSHOT_SWEEP_INTERVAL
+from paginator import PaginationError, count_items, iter_items, iter_pages
+
+# Snapshot entity name -> Mealie list endpoint
+SNAPSHOT_ENTITIES = {
+    "recipes": "/api/recipes",
+    "foods": "/api/foods",
+    "units": "/api/units",
+    "tags": "/api/organizers/tags",
+    "categories": "/api/organizers/categories",
+    "tools": "/api/organizers/tools",
+    "users": "/api/admin/users",
+}
+# Field the server orders/filters on, and the keys the update time comes back as
+UPDATED_FIELD = "updatedAt"
+UPDATED_KEYS = ("updatedAt", "updateAt", "dateUpdated")
+
+_snapshot: "SnapshotStore | None" = None
+_snapshot_lock = threading.Lock()
+
+
+def _updated_at(item: dict) -> str | None:
+    for key in UPDATED_KEYS:
+        if item.get(key):
+            return str(item[key])
+    return None
+
+
+def _rows(entity: str, items: list) -> list[tuple]:
+    return [
+        (entity, str(item["id"]), _updated_at(item), json.dumps(item, ensure_ascii=False))
+        for item in items
+        if item.get("id") is not None
+    ]
+
+
+class SnapshotStore:
+    """
+    Local SQLite copy of the entities currently on the Mealie server.
+
+    The first refresh of an entity pages through its whole list endpoint.
+    Later refreshes only ask for items updated since the newest update time
+    already stored (orderBy/queryFilter on updatedAt) and compare the server's
+    total with the stored count. Only when they differ, or the last ID sweep
+    is older than SNAPSHOT_SWEEP_INTERVAL, are the server's IDs listed: items
+    deleted on the server are dropped, and IDs the snapshot has never seen
+    (or a rejected filter) trigger a full reload. Entities without an update
+    time are always reloaded in full. The snapshot belongs to one
+    server URL; opening it for another server starts it over. Safe to use
+    from several threads.
+    """
+
+    def __init__(self, path: str = SNAPSHOT_FILE, server: str = MEALIE_URL):
+        self.path = path
+        self.server = server
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS items ("
+            " entity TEXT NOT NULL,"
+            " id TEXT NOT NULL,"
+            " updated_at TEXT,"
+            " data TEXT NOT NULL,"
+            " PRIMARY KEY (entity, id))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sync_state ("
+            " entity TEXT PRIMARY KEY,"
+            " synced_until TEXT,"
+            " refreshed_at REAL NOT NULL,"
+            " swept_at REAL)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(sync_state)")}
+        if "swept_at" not in columns:
+            self._conn.execute("ALTER TABLE sync_state ADD COLUMN swept_at REAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'server'").fetchone()
+        if row is None or row[0] != server:
+            # Items of another (or a wiped and re-pointed) server must never be served as this one's
+            if row is not None:
+                print(f"🔁 Snapshot was taken from {row[0]}, starting over for {server}")
+            self._conn.execute("BEGIN")
+            self._conn.execute("DELETE FROM items")
+            self._conn.execute("DELETE FROM sync_state")
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('server', ?)", (server,))
+            self._conn.execute("COMMIT")
+
+    def _state(self, entity: str) -> tuple | None:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT synced_until, refreshed_at, swept_at FROM sync_state WHERE entity = ?", (entity,)
+            ).fetchone()
+
+    @staticmethod
+    def _mark_synced(conn, entity: str, *, swept: bool):
+        """Record the newest stored update time of `entity` (and, after a full listing, the sweep time)"""
+        synced_until = conn.execute("SELECT MAX(updated_at) FROM items WHERE entity = ?", (entity,)).fetchone()[0]
+        now = time.time()
+        if swept:
+            conn.execute(
+                "INSERT OR REPLACE INTO sync_state (entity, synced_until, refreshed_at, swept_at) VALUES (?, ?, ?, ?)",
+                (entity, synced_until, now, now),
+            )
+        else:
+            conn.execute(
+                "INSERT INTO sync_state (entity, synced_until, refreshed_at) VALUES (?, ?, ?)"
+                " ON CONFLICT (entity) DO UPDATE SET synced_until = excluded.synced_until,"
+                " refreshed_at = excluded.refreshed_at",
+                (entity, synced_until, now),
+            )
+
+    def _store(self, entity: str, items: list):
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO items (entity, id, updated_at, data) VALUES (?, ?, ?, ?)",
+                    _rows(entity, items),
+                )
+                self._mark_synced(self._conn, entity, swept=False)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _reload(self, entity: str, limiter) -> int:
+        """Replace the stored items of `entity` with a full listing, written page by page in one transaction"""
+        # Own connection: readers keep seeing the previous items until the reload commits
+        conn = sqlite3.connect(self.path, isolation_level=None, timeout=60)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DELETE FROM items WHERE entity = ?", (entity,))
+                stored = 0
+                for page in iter_pages(SNAPSHOT_ENTITIES[entity], limiter=limiter, label=entity, raise_errors=True):
+                    rows = _rows(entity, page)
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO items (entity, id, updated_at, data) VALUES (?, ?, ?, ?)", rows
+                    )
+                    stored += len(rows)
+                self._mark_synced(conn, entity, swept=True)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+        return stored
+
+    def count(self, entity: str) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM items WHERE entity = ?", (entity,)).fetchone()[0]
+
+    def _ids(self, entity: str) -> set[str]:
+        with self._lock:
+            return {row[0] for row in self._conn.execute("SELECT id FROM items WHERE entity = ?", (entity,))}
+
+    def _drop(self, entity: str, ids):
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany("DELETE FROM items WHERE entity = ? AND id = ?", [(entity, id_) for id_ in ids])
+            self._conn.execute("UPDATE sync_state SET swept_at = ? WHERE entity = ?", (time.time(), entity))
+            self._conn.execute("COMMIT")
+
+    def _refresh_incremental(self, entity: str, state: tuple, limiter) -> int | None:
+        """Fetch items updated since the stored `state`; None if the snapshot no longer matches the server"""
+        synced_until, _, swept_at = state
+        path = SNAPSHOT_ENTITIES[entity]
+        params = {
+            "orderBy": UPDATED_FIELD,
+            "orderDirection": "asc",
+            "queryFilter": f'{UPDATED_FIELD} >= "{synced_until}"',
+        }
+        changed = list(iter_items(path, params=params, limiter=limiter, label=f"changed {entity}", raise_errors=True))
+        self._store(entity, changed)
+        # One item-less page tells the server's total; the full ID list is only needed when it disagrees
+        # (or now and then, since a deletion plus a creation the filter missed keeps the count equal)
+        total = count_items(path, limiter=limiter)
+        sweep_due = not swept_at or (SNAPSHOT_SWEEP_INTERVAL and time.time() - swept_at >= SNAPSHOT_SWEEP_INTERVAL)
+        if total is not None and total == self.count(entity) and not sweep_due:
+            return len(changed)
+        server_ids = {
+            str(item["id"])
+            for item in iter_items(path, fields=("id",), limiter=limiter, label=f"{entity} IDs", raise_errors=True)
+            if item.get("id") is not None
+        }
+        local_ids = self._ids(entity)
+        if server_ids - local_ids:
+            return None
+        self._drop(entity, local_ids - server_ids)
+        return len(changed)
+
+    def refresh(self, entity: str, *, full: bool = False, max_age: float = SNAPSHOT_MAX_AGE, limiter=None) -> int:
+        """Bring the snapshot of `entity` up to date; returns the number of stored items"""
+        with self._refresh_lock:
+            state = None if full else self._state(entity)
+            if state and max_age and time.time() - state[1] < max_age:
+                return self.count(entity)
+
+            if state and state[0]:
+                try:
+                    changed = self._refresh_incremental(entity, state, limiter)
+                    if changed is not None:
+                        print(f"🗂️ Snapshot of {entity}: {changed} changed, {self.count(entity)} total")
+                        return self.count(entity)
+                    print(f"🔁 Snapshot of {entity} is out of sync with the server, reloading")
+                except (PaginationError, requests.exceptions.RequestException) as e:
+                    print(f"⚠️ Incremental refresh of {entity} failed ({e}), reloading")
+
+            try:
+                stored = self._reload(entity, limiter)
+            except (PaginationError, requests.exceptions.RequestException) as e:
+                # The transaction was rolled back, so the previous snapshot is kept rather than a partial listing
+                print(f"❌ Failed to refresh snapshot of {entity}: {e}")
+                return self.count(entity)
+            print(f"🗂️ Snapshot of {entity}: reloaded {stored} items")
+            return stored
+
+    def synced_until(self, entity: str) -> str | None:
+        """Newest update time stored for `entity` (None if unknown)"""
+        state = self._state(entity)
+        return state[0] if state else None
+
+    def items(self, entity: str, fields=None, since: str | None = None) -> list[dict]:
+        """
+        Stored items of `entity`; with `fields` only those keys are read from
+        each item, with `since` only items updated at or after that time.
+        """
+        where = "entity = ?"
+        params = [entity]
+        if since is not None:
+            where += " AND updated_at >= ?"
+            params.append(since)
+        with self._lock:
+            if fields is None:
+                rows = self._conn.execute(f"SELECT data FROM items WHERE {where} ORDER BY rowid", params)
+                return [json.loads(row[0]) for row in rows]
+            columns = ", ".join("json_extract(data, ?)" for _ in fields)
+            rows = self._conn.execute(
+                f"SELECT {columns} FROM items WHERE {where} ORDER BY rowid",
+                (*(f'$."{field}"' for field in fields), *params),
+            )
+            return [dict(zip(fields, row)) for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def get_snapshot() -> SnapshotStore:
+    """Return the process-wide snapshot store (opened on first use)"""
+    global _snapshot
+    if _snapshot is None:
+        with _snapshot_lock:
+            if _snapshot is None:
+                _snapshot = SnapshotStore()
+    return _snapshot
+
+
+def load_entities(entity: str, *, fields=None, since: str | None = None, full: bool = False, limiter=None) -> list[dict]:
+    """Refresh the snapshot of `entity` and return its items (see SnapshotStore.items)"""
+    snapshot = get_snapshot()
+    snapshot.refresh(entity, full=full, limiter=limiter)
+    return snapshot.items(entity, fields, since)
+
+
+def fetch_recipes_by_slug(**kwargs) -> dict[str, dict]:
+    """Every recipe summary on the server, keyed by slug"""
+    return {recipe["slug"]: recipe for recipe in load_entities("recipes", **kwargs)}
+
+
+def fetch_recipe_slugs(**kwargs) -> dict[str, str]:
+    """Map every recipe's new ID to its slug"""
+    return {recipe["id"]: recipe["slug"] for recipe in load_entities("recipes", fields=("id", "slug"), **kwargs)}
@@ -5,20 +5,52 @@ import uuid
 import time
 import re
 import argparse
-from config import MEALIE_URL, HEADERS, OPENROUTER_URL, OPENROUTER_MODEL, get_openrouter_headers, MEALIE_VERIFY_SSL
-
-# Disable SSL warnings only when verification is disabled (opt-in via env)
-import urllib3
-if not MEALIE_VERIFY_SSL:
-    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-
-# Configuration for robust connection handling
-MAX_RETRIES = 3
-REQUEST_TIMEOUT = 30
+import threading
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+import http_client
+from backup_loader import load_backup
+from mapping_index import MappingIndex, EntityMapping, load_mapping_index, mappings_available
+from parser_cache import ParserCache
+from progress_journal import ProgressJournal, payload_hash
+from snapshot_store import fetch_recipes_by_slug
+from rate_limiter import AdaptiveRateLimiter
+from config import (
+    MEALIE_URL,
+    OPENROUTER_URL,
+    OPENROUTER_MODEL,
+    OPENROUTER_BATCH_SIZE,
+    OPENROUTER_WORKERS,
+    OPENROUTER_REQUESTS_PER_MINUTE,
+    get_openrouter_headers,
+    MAX_RETRIES,
+    REQUEST_TIMEOUT,
+    NORMALIZE_CACHE_SIZE,
+)
 
 # --- OpenRouter setup ---
 OPENROUTER_HEADERS = get_openrouter_headers()
+# Separate keep-alive pool for OpenRouter; retries stay in parse_original_text_with_openrouter
+OPENROUTER_SESSION = http_client.build_session(OPENROUTER_HEADERS, max_retries=0) if OPENROUTER_HEADERS else None
+# Keeps all OpenRouter calls within the requests-per-minute budget (LLM latency is not a load signal)
+OPENROUTER_LIMITER = AdaptiveRateLimiter(
+    OPENROUTER_REQUESTS_PER_MINUTE / 60,
+    min_rate=OPENROUTER_REQUESTS_PER_MINUTE / 600,
+    max_rate=OPENROUTER_REQUESTS_PER_MINUTE / 60,
+    latency_threshold=float("inf"),
+)
+# Lines currently being parsed, so concurrent callers wait for one request instead of sending their own
+_INFLIGHT_PARSES: dict[str, Future] = {}
+_INFLIGHT_LOCK = threading.Lock()
 PARSER_CACHE: dict[str, dict] = {}
+# Bump when the OpenRouter prompt changes so persisted parses are not reused
+PROMPT_VERSION = "1"
+# Persistent cache behind PARSER_CACHE, opened on first LLM lookup
+_persistent_parser_cache: ParserCache | None = None
+
+# Paces recipe PATCHes; adapts to how fast Mealie responds
+RATE_LIMITER = AdaptiveRateLimiter()
 
 # Small map of common German unit synonyms to canonical names used in Mealie
 UNIT_SYNONYMS = {
@@ -58,64 +90,165 @@ UNIT_SYNONYMS.update({
 })
 
 # --- Helpers ---
+# very light umlaut normalization, applied in one pass after strip/lower
+UMLAUT_TABLE = str.maketrans({"ä": "a", "ö": "o", "ü": "u", "ß": "ss"})
+
+
+# Memoized: the same unit/food names and tokens are normalized over and over
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
 def _normalize(s: str) -> str:
     if not s:
         return ""
-    s = s.strip().lower()
-    # very light umlaut normalization
-    s = s.replace("ä", "a").replace("ö", "o").replace("ü", "u").replace("ß", "ss")
-    return s
-
-
-def map_unit_name_to_id(unit_name: str, unit_mappings: dict) -> tuple[str | None, str | None]:
-    if not unit_name:
-        return None, None
-    key = _normalize(unit_name)
-    key = UNIT_SYNONYMS.get(key, unit_name if unit_name else None)
-    if not key:
-        return None, None
-    # Try exact key match in mapping keys (case-insensitive)
-    for name, meta in unit_mappings.items():
-        if _normalize(name) == _normalize(key):
-            return meta.get("new_id"), name
-    # Try synonyms again against mapping keys
-    for name, meta in unit_mappings.items():
-        if _normalize(name) in UNIT_SYNONYMS and UNIT_SYNONYMS[_normalize(name)] == key:
-            return meta.get("new_id"), name
-    return None, key  # keep canonicalized name for display, even if id missing
-
-
-def map_food_name_to_id(food_name: str, food_mappings: dict) -> tuple[str | None, str | None]:
-    if not food_name:
-        return None, None
-    # Exact match by name (case-insensitive)
-    norm_target = _normalize(food_name)
-    for name, meta in food_mappings.items():
-        if _normalize(name) == norm_target:
-            return meta.get("new_id"), name
-    # Loose startswith/contains fallback
-    for name, meta in food_mappings.items():
-        n = _normalize(name)
-        if norm_target in n or n in norm_target:
-            return meta.get("new_id"), name
-    return None, food_name
+    return s.strip().lower().translate(UMLAUT_TABLE)
+
+
+def canonical_unit(token: str) -> str | None:
+    """Canonical Mealie unit name for a raw unit token, if it is a known synonym"""
+    return UNIT_SYNONYMS.get(_normalize(token))
+
+
+class UnitResolver:
+    """
+    Unit lookups for map_unit_name_to_id, precomputed from the unit mappings
+    and UNIT_SYNONYMS. Answers are cached per raw token, and tokens that map
+    to no unit id are counted in `unresolved` so the synonym table can be
+    extended from real data.
+    """
+
+    def __init__(self, unit_mappings):
+        self.mappings = unit_mappings
+        self._by_name: dict[str, tuple[str | None, str]] = {}
+        self._by_synonym: dict[str, tuple[str | None, str]] = {}
+        for name, meta in unit_mappings.items():
+            norm = _normalize(name)
+            # First entry wins, matching the order of the former linear scans
+            self._by_name.setdefault(norm, (meta.get("new_id"), name))
+            if norm in UNIT_SYNONYMS:
+                self._by_synonym.setdefault(UNIT_SYNONYMS[norm], (meta.get("new_id"), name))
+        self._resolved: dict[str, tuple[str | None, str | None]] = {}
+        self.unresolved: Counter[str] = Counter()
+
+    def resolve(self, unit_name: str) -> tuple[str | None, str | None]:
+        if not unit_name:
+            return None, None
+        result = self._resolved.get(unit_name)
+        if result is None:
+            key = canonical_unit(unit_name) or unit_name
+            # Exact key match in mapping keys (case-insensitive), then synonyms of mapping keys
+            result = self._by_name.get(_normalize(key)) or self._by_synonym.get(key) or (None, key)
+            self._resolved[unit_name] = result
+        if result[0] is None:
+            self.unresolved[result[1]] += 1
+        return result  # keeps the canonicalized name for display, even if id missing
+
+
+_UNIT_RESOLVERS: dict[int, UnitResolver] = {}
+
+
+def get_unit_resolver(unit_mappings) -> UnitResolver:
+    """Build the resolver for a unit mapping once and reuse it for every ingredient"""
+    resolver = _UNIT_RESOLVERS.get(id(unit_mappings))
+    if resolver is None or resolver.mappings is not unit_mappings:
+        resolver = UnitResolver(unit_mappings)
+        _UNIT_RESOLVERS[id(unit_mappings)] = resolver
+    return resolver
+
+
+def map_unit_name_to_id(unit_name: str, unit_mappings) -> tuple[str | None, str | None]:
+    return get_unit_resolver(unit_mappings).resolve(unit_name)
+
+
+class FoodMatcher:
+    """
+    Pre-normalized index over the food mappings for map_food_name_to_id.
+
+    Exact matches come from a dict. For the containment fallback, names that
+    contain the target are found through a trigram index, and names contained
+    in the target by looking up the target's substrings (only at lengths that
+    occur among food names). Ties go to the earliest mapping entry, which is
+    what the former linear scan returned.
+    """
+
+    def __init__(self, food_mappings):
+        self.mappings = food_mappings
+        self._entries = list(food_mappings.items())
+        self._norms = [_normalize(name) for name, _ in self._entries]
+        self._first_by_norm: dict[str, int] = {}
+        self._trigrams: dict[str, set[int]] = {}
+        for i, norm in enumerate(self._norms):
+            self._first_by_norm.setdefault(norm, i)
+            for j in range(len(norm) - 2):
+                self._trigrams.setdefault(norm[j:j + 3], set()).add(i)
+        self._lengths = sorted({len(norm) for norm in self._first_by_norm})
+
+    def _names_containing(self, target: str) -> int | None:
+        if len(target) < 3:
+            return next((i for i, norm in enumerate(self._norms) if target in norm), None)
+        postings = [self._trigrams.get(target[j:j + 3]) for j in range(len(target) - 2)]
+        if not all(postings):
+            return None
+        candidates = set.intersection(*sorted(postings, key=len))
+        return min((i for i in candidates if target in self._norms[i]), default=None)
 
+    def _names_contained_in(self, target: str) -> int | None:
+        best = None
+        for length in self._lengths:
+            if length > len(target):
+                break
+            for j in range(len(target) - length + 1):
+                i = self._first_by_norm.get(target[j:j + length])
+                if i is not None and (best is None or i < best):
+                    best = i
+        return best
 
-def parse_original_text_with_openrouter(original_text: str) -> dict | None:
-    if not OPENROUTER_HEADERS or not original_text:
-        return None
-    if original_text in PARSER_CACHE:
-        return PARSER_CACHE[original_text]
+    def match(self, food_name: str) -> tuple[str | None, str | None]:
+        if not food_name:
+            return None, None
+        # Exact match by name (case-insensitive)
+        norm_target = _normalize(food_name)
+        i = self._first_by_norm.get(norm_target)
+        if i is None:
+            # Loose startswith/contains fallback
+            found = [c for c in (self._names_containing(norm_target), self._names_contained_in(norm_target)) if c is not None]
+            i = min(found) if found else None
+        if i is None:
+            return None, food_name
+        name, meta = self._entries[i]
+        return meta.get("new_id"), name
+
+
+_FOOD_MATCHERS: dict[int, FoodMatcher] = {}
+
+
+def get_food_matcher(food_mappings) -> FoodMatcher:
+    """Build the matcher for a food mapping once and reuse it for every ingredient"""
+    matcher = _FOOD_MATCHERS.get(id(food_mappings))
+    if matcher is None or matcher.mappings is not food_mappings:
+        matcher = FoodMatcher(food_mappings)
+        _FOOD_MATCHERS[id(food_mappings)] = matcher
+    return matcher
+
+
+def map_food_name_to_id(food_name: str, food_mappings) -> tuple[str | None, str | None]:
+    return get_food_matcher(food_mappings).match(food_name)
+
+
+def get_parser_cache() -> ParserCache:
+    global _persistent_parser_cache
+    if _persistent_parser_cache is None:
+        _persistent_parser_cache = ParserCache()
+    return _persistent_parser_cache
 
-    system = (
-        "You are a strict ingredient parser for German cooking texts. "
-        "Extract a single ingredient into JSON with keys: quantity (number or null), "
-        "unit (string or null, singular German like 'Esslöffel','Teelöffel','Gramm','Milliliter','Liter','Prise','Stück','Zehe'), "
-        "food (string, concise singular, capitalize where appropriate), note (string or null). "
-        "Convert vulgar fractions to decimals (e.g., 1/2 -> 0.5). Do not guess amounts if missing. Output ONLY JSON."
-    )
-    user = f"Text: {original_text}"
 
+PARSE_RULES = (
+    "unit (string or null, singular German like 'Esslöffel','Teelöffel','Gramm','Milliliter','Liter','Prise','Stück','Zehe'), "
+    "food (string, concise singular, capitalize where appropriate), note (string or null). "
+    "Convert vulgar fractions to decimals (e.g., 1/2 -> 0.5). Do not guess amounts if missing. Output ONLY JSON."
+)
+
+
+def _openrouter_json(system: str, user: str) -> dict | None:
+    """Send one chat completion and return its JSON content (None after MAX_RETRIES failures)"""
     body = {
         "model": OPENROUTER_MODEL,
         "messages": [
@@ -128,18 +261,21 @@ def parse_original_text_with_openrouter(original_text: str) -> dict | None:
 
     for attempt in range(1, MAX_RETRIES + 1):
         try:
-            resp = requests.post(
-                OPENROUTER_URL,
-                headers=OPENROUTER_HEADERS,
-                json=body,
-                timeout=REQUEST_TIMEOUT,
-            )
+            OPENROUTER_LIMITER.acquire()
+            try:
+                resp = OPENROUTER_SESSION.post(
+                    OPENROUTER_URL,
+                    json=body,
+                    timeout=REQUEST_TIMEOUT,
+                )
+            except requests.exceptions.RequestException:
+                OPENROUTER_LIMITER.record(None)
+                raise
+            OPENROUTER_LIMITER.record(resp)
             if resp.status_code == 200:
                 data = resp.json()
                 content = data.get("choices", [{}])[0].get("message", {}).get("content", "{}")
-                parsed = json.loads(content)
-                PARSER_CACHE[original_text] = parsed
-                return parsed
+                return json.loads(content)
             else:
                 # Backoff on rate limits etc.
                 if attempt < MAX_RETRIES:
@@ -152,62 +288,188 @@ def parse_original_text_with_openrouter(original_text: str) -> dict | None:
             else:
                 return None
 
-# Load mappings from mappings.json
-def load_mappings():
-    MAPPINGS_FILE = "mappings.json"
-    if not os.path.exists(MAPPINGS_FILE):
-        print("⚠️ mappings.json not found. Make sure to generate it.")
-        return {}
-    
-    with open(MAPPINGS_FILE, "r", encoding="utf-8") as file:
-        return json.load(file)
+
+def _cached_parse(original_text: str) -> dict | None:
+    if original_text in PARSER_CACHE:
+        return PARSER_CACHE[original_text]
+    cached = get_parser_cache().get(original_text, OPENROUTER_MODEL, PROMPT_VERSION)
+    if cached is not None:
+        PARSER_CACHE[original_text] = cached
+    return cached
+
+
+def _remember_parse(original_text: str, parsed: dict):
+    PARSER_CACHE[original_text] = parsed
+    get_parser_cache().put(original_text, OPENROUTER_MODEL, PROMPT_VERSION, parsed)
+
+
+def _claim_parses(texts) -> tuple[list[str], dict[str, Future]]:
+    """Split texts into ones this caller must parse and ones already in flight elsewhere"""
+    mine, waiting = [], {}
+    with _INFLIGHT_LOCK:
+        for text in texts:
+            if text in _INFLIGHT_PARSES:
+                waiting[text] = _INFLIGHT_PARSES[text]
+            else:
+                _INFLIGHT_PARSES[text] = Future()
+                mine.append(text)
+    return mine, waiting
+
+
+def _release_parse(text: str, parsed: dict | None):
+    with _INFLIGHT_LOCK:
+        future = _INFLIGHT_PARSES.pop(text, None)
+    if future is not None:
+        future.set_result(parsed)
+
+
+def parse_original_text_with_openrouter(original_text: str) -> dict | None:
+    if not OPENROUTER_HEADERS or not original_text:
+        return None
+    cached = _cached_parse(original_text)
+    if cached is not None:
+        return cached
+
+    mine, waiting = _claim_parses([original_text])
+    if waiting:
+        return waiting[original_text].result()
+    parsed = None
+    try:
+        parsed = _request_single_parse(original_text)
+    finally:
+        _release_parse(original_text, parsed)
+    return parsed
+
+
+def _request_single_parse(original_text: str) -> dict | None:
+    system = (
+        "You are a strict ingredient parser for German cooking texts. "
+        "Extract a single ingredient into JSON with keys: quantity (number or null), "
+        + PARSE_RULES
+    )
+    user = f"Text: {original_text}"
+
+    parsed = _openrouter_json(system, user)
+    if parsed is not None:
+        _remember_parse(original_text, parsed)
+    return parsed
+
+
+def _parse_batch_with_openrouter(lines: list[str]) -> list[dict] | None:
+    """Parse several lines in one request; None if the response does not line up with the input"""
+    system = (
+        "You are a strict ingredient parser for German cooking texts. "
+        "You receive a JSON array of ingredient lines. Return a JSON object {\"items\": [...]} with exactly one "
+        "entry per input line, in the same order. Each entry has keys: index (position in the input array), "
+        "quantity (number or null), "
+        + PARSE_RULES
+    )
+    user = "Lines: " + json.dumps(lines, ensure_ascii=False)
+
+    result = _openrouter_json(system, user)
+    items = result.get("items") if isinstance(result, dict) else None
+    if not isinstance(items, list) or len(items) != len(lines) or not all(isinstance(i, dict) for i in items):
+        return None
+    if all(isinstance(i.get("index"), int) for i in items):
+        if sorted(i["index"] for i in items) != list(range(len(lines))):
+            return None
+        items = sorted(items, key=lambda i: i["index"])
+    return [{k: v for k, v in item.items() if k != "index"} for item in items]
+
+
+def _resolve_chunk(chunk: list[str]) -> dict[str, dict | None]:
+    """Parse a claimed chunk (batch first, single-line fallback) and release its lines"""
+    results: dict[str, dict | None] = {}
+    try:
+        parsed_chunk = _parse_batch_with_openrouter(chunk) if len(chunk) > 1 else None
+        if parsed_chunk is None:
+            for text in chunk:
+                results[text] = _request_single_parse(text)
+        else:
+            for text, parsed in zip(chunk, parsed_chunk):
+                _remember_parse(text, parsed)
+                results[text] = parsed
+    finally:
+        for text in chunk:
+            _release_parse(text, results.get(text))
+    return results
+
+
+def parse_many_with_openrouter(original_texts, batch_size: int = OPENROUTER_BATCH_SIZE, workers: int = 1) -> dict[str, dict | None]:
+    """
+    Parse many lines with as few OpenRouter requests as possible.
+
+    Cached lines are answered locally; the rest are deduplicated and sent in
+    chunks of `batch_size`, up to `workers` chunks at a time (all requests
+    share OPENROUTER_LIMITER). A chunk whose response is malformed falls back
+    to one request per line. Lines already being parsed by another caller
+    are awaited rather than requested again. Returns {original_text: parsed or None}.
+    """
+    results: dict[str, dict | None] = {}
+    if not OPENROUTER_HEADERS:
+        return results
+
+    pending = []
+    for text in dict.fromkeys(t for t in original_texts if t):
+        cached = _cached_parse(text)
+        if cached is not None:
+            results[text] = cached
+        else:
+            pending.append(text)
+
+    mine, waiting = _claim_parses(pending)
+    size = max(1, batch_size)
+    chunks = [mine[start:start + size] for start in range(0, len(mine), size)]
+    if workers > 1 and len(chunks) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for chunk_results in executor.map(_resolve_chunk, chunks):
+                results.update(chunk_results)
+    else:
+        for chunk in chunks:
+            results.update(_resolve_chunk(chunk))
+
+    for text, future in waiting.items():
+        results[text] = future.result()
+    return results
+
+
+def prefetch_llm_parses(old_ingredient_lists, workers: int = OPENROUTER_WORKERS) -> int:
+    """
+    Resolve every line the local parser cannot handle before payloads are built,
+    so construct_ingredient_payload only hits the cache. Returns the number of
+    unique lines that needed the LLM.
+    """
+    if not OPENROUTER_HEADERS:
+        return 0
+    lines = list(dict.fromkeys(
+        ingr.get("original_text")
+        for old_ingr in old_ingredient_lists
+        for ingr in old_ingr
+        if ingr.get("original_text")
+    ))
+    texts = [line for line, parsed in zip(lines, parse_many(lines)) if not parsed]
+    if texts:
+        print(f"🧠 Pre-parsing {len(texts)} unique ingredient lines with OpenRouter ({workers} workers)...")
+        parse_many_with_openrouter(texts, workers=workers)
+    return len(texts)
+
+# Load mappings from the mapping store
+def load_mappings() -> MappingIndex:
+    if not mappings_available():
+        print("⚠️ No ID mappings found. Make sure to generate them.")
+
+    return load_mapping_index()
 
 # Load old database from database.json
 def load_old_database():
     DATABASE_FILE = "database.json"
     if not os.path.exists(DATABASE_FILE):
         print("⚠️ database.json not found. Make sure to provide it.")
-        return {}, []
-    
-    with open(DATABASE_FILE, "r", encoding="utf-8") as file:
-        data = json.load(file)
-    
-    recipes = {recipe["id"]: recipe for recipe in data.get("recipes", [])}
-    ingredients = data.get("recipes_ingredients", [])
-    return recipes, ingredients
-
-# Fetch all recipes from Mealie
-def fetch_all_recipes():
-    recipes = {}
-    page = 1
-    per_page = 100
-    
-    while True:
-        url = f"{MEALIE_URL}/api/recipes?page={page}&perPage={per_page}"
-        response = requests.get(url, headers=HEADERS, verify=MEALIE_VERIFY_SSL, timeout=REQUEST_TIMEOUT)
-        
-        print(f"🔄 Fetching recipes: Page {page}, Status Code: {response.status_code}")
-        
-        if response.status_code == 200:
-            try:
-                data = response.json()
-                items = data.get("items", [])
-                
-                if not items:
-                    break
-                
-                for recipe in items:
-                    recipes[recipe["slug"]] = recipe  # Use slug instead of ID
-                
-                page += 1
-            except requests.exceptions.JSONDecodeError:
-                print("❌ Error: Response is not valid JSON!")
-                break
-        else:
-            print(f"⚠️ Failed to fetch recipes: {response.text}")
-            break
+        return {}, {}
     
-    return recipes
+    backup = load_backup(DATABASE_FILE, tables=("recipes", "recipes_ingredients"))
+    # Ingredients grouped once by recipe_id (original order kept) instead of filtered per recipe
+    return backup.recipes_by_id, backup.ingredients_by_recipe_id
 
 # --- Local deterministic parser (German) ---
 FRACTION_MAP = {
@@ -215,9 +477,13 @@ FRACTION_MAP = {
     "¼": 0.25, "1/4": 0.25, "¾": 0.75, "3/4": 0.75,
     "⅓": 1/3, "1/3": 1/3, "⅔": 2/3, "2/3": 2/3,
 }
-UNIT_TOKEN_PATTERN = r"(?:" + "|".join(sorted({re.escape(k) for k in list(UNIT_SYNONYMS.keys()) + [
-    "el","tl","g","kg","ml","l","esslöffel","teelöffel","gramm","milliliter","liter","prise","stück","zehe"
-]})) + r")"
+# Compiled once; parse_original_text_local runs for every ingredient line of the backup
+PAREN_NOTE_PATTERN = re.compile(r"\(([^\)]+)\)")
+SIMPLE_FRACTION_PATTERN = re.compile(r"^(\d+)\s*/\s*(\d+)$")
+# Garlic cloves: "knoblauchzehe(n)" (incl. the common "koblauch" typo) or "knoblauch zehe(n)"
+GARLIC_COMPOUND_PREFIXES = ("knoblauchzeh", "koblauchzeh")
+GARLIC_WORDS = frozenset({"knoblauch", "koblauch"})
+CLOVE_WORDS = frozenset({"zehe", "zehen"})
 
 ADJECTIVE_NOTES = {
     "lauwarm": "lauwarm",
@@ -250,7 +516,7 @@ def _to_number(tok: str) -> float | None:
     if tok in FRACTION_MAP:
         return float(FRACTION_MAP[tok])
     # simple fraction a/b
-    m = re.match(r"^(\d+)\s*/\s*(\d+)$", tok)
+    m = SIMPLE_FRACTION_PATTERN.match(tok)
     if m:
         a, b = m.groups()
         try:
@@ -270,59 +536,55 @@ def parse_original_text_local(original_text: str) -> dict | None:
     text = original_text.strip()
     # extract parenthetical note
     paren_note = None
-    m = re.search(r"\(([^\)]+)\)", text)
+    m = PAREN_NOTE_PATTERN.search(text)
     if m:
         paren_note = m.group(1).strip()
         text = (text[:m.start()] + text[m.end():]).strip()
 
-    # tokens
+    # tokens, each normalized exactly once; `pos` walks quantity -> unit -> food/notes
     tokens = text.split()
+    norms = [_normalize(t) for t in tokens]
+    count = len(tokens)
+    pos = 0
     qty = None
     unit = None
     note_parts = []
 
     # quantity first token (number or vulgar fraction)
-    if tokens:
-        q = _to_number(tokens[0])
-        if q is not None:
-            qty = q
-            tokens = tokens[1:]
+    if count:
+        qty = _to_number(tokens[0])
+        if qty is not None:
+            pos = 1
 
     # unit next token
-    if tokens:
-        t0 = _normalize(tokens[0])
-        if t0 in UNIT_SYNONYMS:
-            unit = UNIT_SYNONYMS[t0]
-            tokens = tokens[1:]
+    if pos < count:
+        unit = UNIT_SYNONYMS.get(norms[pos])
+        if unit:
+            pos += 1
 
     # Special-case: garlic cloves in various spellings (e.g., "2 knoblauchzehen" -> 2 Zehen Knoblauch)
     garlic_as_compound = False
-    if unit is None and tokens:
-        t0n = _normalize(tokens[0])
-        t1n = _normalize(tokens[1]) if len(tokens) > 1 else ""
-        if (
-            t0n in {"knoblauchzehe", "knoblauchzehen", "koblauchzehe", "koblauchzehen"}
-            or t0n.startswith("knoblauchzeh") or t0n.startswith("koblauchzeh")
-            or (t0n == "knoblauch" and t1n in {"zehe", "zehen"})
-            or (t0n == "koblauch" and t1n in {"zehe", "zehen"})
-        ):
-            unit = "Zehe"
+    if unit is None and pos < count:
+        t0n = norms[pos]
+        t1n = norms[pos + 1] if pos + 1 < count else ""
+        if t0n in GARLIC_WORDS and t1n in CLOVE_WORDS:
+            pos += 2
             garlic_as_compound = True
-            # consume one or two tokens depending on split variant
-            if (t0n in {"knoblauch", "koblauch"} and t1n in {"zehe", "zehen"}):
-                tokens = tokens[2:]
-            else:
-                tokens = tokens[1:]
+        elif t0n.startswith(GARLIC_COMPOUND_PREFIXES):
+            pos += 1
+            garlic_as_compound = True
+        if garlic_as_compound:
+            unit = "Zehe"
 
     # remaining tokens: try to separate adjective notes from food
     # collect adjectives that match our list as notes, rest becomes food
     food_tokens = ["Knoblauch"] if garlic_as_compound else []
-    for t in tokens:
-        tn = _normalize(t)
-        if tn in ADJECTIVE_NOTES:
-            note_parts.append(ADJECTIVE_NOTES[tn])
+    for i in range(pos, count):
+        note_word = ADJECTIVE_NOTES.get(norms[i])
+        if note_word:
+            note_parts.append(note_word)
         else:
-            food_tokens.append(t)
+            food_tokens.append(tokens[i])
 
     food = " ".join(food_tokens).strip()
     note = paren_note or (" ".join(note_parts).strip() if note_parts else None)
@@ -342,6 +604,20 @@ def parse_original_text_local(original_text: str) -> dict | None:
         "note": note,
     }
 
+
+def parse_many(lines) -> list[dict | None]:
+    """
+    parse_original_text_local over many lines; repeated lines are parsed once
+    and share the same result dict (treat results as read-only).
+    """
+    seen: dict[str, dict | None] = {}
+    results = []
+    for line in lines:
+        if line not in seen:
+            seen[line] = parse_original_text_local(line)
+        results.append(seen[line])
+    return results
+
 # Helper: singularize food for display when quantity == 1
 def _singularize_food_for_display(food: str, qty) -> str:
     if not food:
@@ -357,19 +633,23 @@ def _singularize_food_for_display(food: str, qty) -> str:
     return food
 
 # Construct ingredients in the required format
-def construct_ingredient_payload(old_ingr, unit_mappings, food_mappings):
+def construct_ingredient_payload(old_ingr, unit_mappings: EntityMapping, food_mappings: EntityMapping):
     ingredients = []
-    
-    for ingr in old_ingr:
-        # START: original mapping based on old ids (fallback)
-        unit_entry = next((u for u in unit_mappings.values() if u.get("old_id") == ingr.get("unit_id")), {})
-        food_entry = next((f for f in food_mappings.values() if f.get("old_id") == ingr.get("food_id")), {})
 
-        unit_id = unit_entry.get("new_id")
-        unit_name = next((name for name, u in unit_mappings.items() if u.get("old_id") == ingr.get("unit_id")), None)
+    # --- Deterministic local parse first ---
+    local_parses = parse_many(ingr.get("original_text", "") for ingr in old_ingr)
+    # then LLM fallback only if needed, batched across the recipe's unparsed lines
+    llm_parses = parse_many_with_openrouter(
+        ingr.get("original_text", "") for ingr, parsed in zip(old_ingr, local_parses) if not parsed
+    )
 
-        food_id = food_entry.get("new_id")
-        food_name = next((name for name, f in food_mappings.items() if f.get("old_id") == ingr.get("food_id")), None)
+    for ingr, local_parsed in zip(old_ingr, local_parses):
+        # START: original mapping based on old ids (fallback)
+        unit_id = unit_mappings.new_id_for(ingr.get("unit_id"))
+        unit_name = unit_mappings.name_for_old_id(ingr.get("unit_id"))
+
+        food_id = food_mappings.new_id_for(ingr.get("food_id"))
+        food_name = food_mappings.name_for_old_id(ingr.get("food_id"))
         # END: fallback
 
         note = (ingr.get("note", "") or "").strip()
@@ -377,11 +657,7 @@ def construct_ingredient_payload(old_ingr, unit_mappings, food_mappings):
         reference_id = ingr.get("reference_id", str(uuid.uuid4()))
         original_text = ingr.get("original_text", "")
 
-        # --- Deterministic local parse first ---
-        parsed = parse_original_text_local(original_text)
-        # then LLM fallback only if needed
-        if not parsed:
-            parsed = parse_original_text_with_openrouter(original_text)
+        parsed = local_parsed or llm_parses.get(original_text)
 
         parsed_food_for_display = None
         if parsed:
@@ -485,38 +761,31 @@ def update_recipe_ingredients(recipe_slug, ingredients, *, dry_run: bool = False
         print(f"🧪 Dry run: would PATCH {url} with {len(ingredients)} ingredients")
         return True
     
-    # Retry logic for robust connection handling
-    for attempt in range(1, MAX_RETRIES + 1):
-        try:
-            print(f"🔍 Attempt {attempt}/{MAX_RETRIES}: Updating ingredients for recipe {recipe_slug}")
-            response = requests.patch(url, headers=HEADERS, json=payload, verify=MEALIE_VERIFY_SSL, timeout=REQUEST_TIMEOUT)
-            
-            if response.status_code == 200:
-                print(f"✅ Successfully updated ingredients for recipe: {recipe_slug}")
-                return True
-            else:
-                print(f"❌ Failed to update ingredients for recipe {recipe_slug} - {response.text}")
-                return False
-                
-        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout, requests.exceptions.ReadTimeout) as e:
-            print(f"⚠️ Connection issue on attempt {attempt}: {e}")
-            if attempt < MAX_RETRIES:
-                wait_time = attempt * 2  # Exponential backoff
-                print(f"⏳ Waiting {wait_time} seconds before retry...")
-                time.sleep(wait_time)
-            else:
-                print(f"❌ Failed to update ingredients for recipe {recipe_slug} after {MAX_RETRIES} attempts")
-                return False
-        except Exception as e:
-            print(f"❌ Unexpected error updating ingredients for recipe {recipe_slug}: {e}")
+    # Connection errors and transient 5xx/429 responses are retried by http_client
+    try:
+        print(f"🔍 Updating ingredients for recipe {recipe_slug}")
+        response = http_client.patch(f"/api/recipes/{recipe_slug}", json=payload, limiter=RATE_LIMITER)
+
+        if response.status_code == 200:
+            print(f"✅ Successfully updated ingredients for recipe: {recipe_slug}")
+            return True
+        else:
+            print(f"❌ Failed to update ingredients for recipe {recipe_slug} - {response.text}")
             return False
 
+    except requests.exceptions.RequestException as e:
+        print(f"❌ Failed to update ingredients for recipe {recipe_slug} after retries: {e}")
+        return False
+    except Exception as e:
+        print(f"❌ Unexpected error updating ingredients for recipe {recipe_slug}: {e}")
+        return False
+
 # Process recipes and update their ingredients
-def process_recipe_updates(target_slugs: set[str] | None = None, *, dry_run: bool = False):
+def process_recipe_updates(target_slugs: set[str] | None = None, *, dry_run: bool = False, llm_workers: int = OPENROUTER_WORKERS, resume: bool = False):
     print("🚀 Starting robust recipe ingredients update...")
     mappings = load_mappings()
     old_recipes, old_ingredients = load_old_database()
-    new_recipes = fetch_all_recipes()
+    new_recipes = fetch_recipes_by_slug()
 
     if not new_recipes:
         print("⚠️ No recipes found. Exiting.")
@@ -532,9 +801,23 @@ def process_recipe_updates(target_slugs: set[str] | None = None, *, dry_run: boo
             print("⚠️ No recipes matched the provided slugs. Exiting.")
             return
 
-    recipe_mappings = mappings.get("recipes", {})
-    unit_mappings = mappings.get("units", {})
-    food_mappings = mappings.get("foods", {})
+    recipe_mappings = mappings["recipes"]
+    unit_mappings = mappings["units"]
+    food_mappings = mappings["foods"]
+
+    # Completed PATCHes are journaled (keyed by slug, hashed over the source rows) so
+    # --resume skips them before any parsing; dry runs neither read nor write the journal
+    journal = ProgressJournal("ingredients", resume=resume) if not dry_run else None
+    source_hashes = {
+        slug: payload_hash(old_ingredients.get(str(recipe_mappings.old_id_for(recipe["id"])), []))
+        for slug, recipe in new_recipes.items()
+    } if journal is not None else {}
+    resumed = 0
+    if journal is not None and resume:
+        before = len(new_recipes)
+        new_recipes = {slug: r for slug, r in new_recipes.items() if not journal.is_done(slug, source_hashes[slug])}
+        resumed = before - len(new_recipes)
+        print(f"⏩ Resuming: skipping {resumed} recipes already updated in the previous run")
 
     total_recipes = len(new_recipes)
     processed = 0
@@ -543,43 +826,70 @@ def process_recipe_updates(target_slugs: set[str] | None = None, *, dry_run: boo
 
     print(f"📊 Found {total_recipes} recipes to process")
 
-    for recipe_slug, recipe in new_recipes.items():
-        processed += 1
-        old_recipe_id = next((mapping["old_id"] for old_name, mapping in recipe_mappings.items() if mapping.get("new_id") == recipe["id"]), None)
-
-        print(f"📋 Progress: {processed}/{total_recipes} - Processing: {recipe.get('name', recipe_slug)}")
+    # LLM pre-pass over all selected recipes: dedupe lines and parse them concurrently up front
+    selected_old_ids = (recipe_mappings.old_id_for(recipe["id"]) for recipe in new_recipes.values())
+    prefetch_llm_parses(
+        (old_ingredients.get(str(old_id), []) for old_id in selected_old_ids if old_id),
+        workers=llm_workers,
+    )
 
-        if old_recipe_id:
-            old_ingr = [ingr for ingr in old_ingredients if str(ingr["recipe_id"]) == str(old_recipe_id)]
-            if old_ingr:
-                parsed_ingredients = construct_ingredient_payload(old_ingr, unit_mappings, food_mappings)
-                if parsed_ingredients:
-                    success = update_recipe_ingredients(recipe_slug, parsed_ingredients, dry_run=dry_run)
-                    if success:
-                        successful += 1
+    try:
+        for recipe_slug, recipe in new_recipes.items():
+            processed += 1
+            old_recipe_id = recipe_mappings.old_id_for(recipe["id"])
+
+            print(f"📋 Progress: {processed}/{total_recipes} - Processing: {recipe.get('name', recipe_slug)}")
+
+            if old_recipe_id:
+                old_ingr = old_ingredients.get(str(old_recipe_id), [])
+                if old_ingr:
+                    parsed_ingredients = construct_ingredient_payload(old_ingr, unit_mappings, food_mappings)
+                    if parsed_ingredients:
+                        success = update_recipe_ingredients(recipe_slug, parsed_ingredients, dry_run=dry_run)
+                        if journal is not None:
+                            journal.record(recipe_slug, "done" if success else "failed", source_hashes[recipe_slug])
+                        if success:
+                            successful += 1
+                        else:
+                            failed += 1
                     else:
+                        print(f"⚠️ No valid ingredients constructed for recipe {recipe_slug}")
                         failed += 1
-                    time.sleep(1)  # Small delay between requests
                 else:
-                    print(f"⚠️ No valid ingredients constructed for recipe {recipe_slug}")
+                    print(f"⚠️ No old ingredients found for recipe {recipe_slug}")
                     failed += 1
             else:
-                print(f"⚠️ No old ingredients found for recipe {recipe_slug}")
+                print(f"⚠️ No old recipe ID mapping found for recipe {recipe_slug}")
                 failed += 1
-        else:
-            print(f"⚠️ No old recipe ID mapping found for recipe {recipe_slug}")
-            failed += 1
+
+    finally:
+        # Also on errors/Ctrl+C, so batched records reach the disk for --resume
+        if journal is not None:
+            journal.close()
 
     print("\n🎉 Recipe ingredients update completed!")
     print(f"📊 Final Results:")
     print(f"✅ Successful updates: {successful}")
     print(f"❌ Failed updates: {failed}")
+    if resumed:
+        print(f"⏩ Skipped (done in previous run): {resumed}")
     print(f"📋 Total processed: {processed}")
+    unresolved_units = get_unit_resolver(unit_mappings).unresolved
+    if unresolved_units:
+        top = ", ".join(f"{token} ×{count}" for token, count in unresolved_units.most_common(10))
+        print(f"📏 Unresolved unit tokens ({len(unresolved_units)} distinct): {top}")
+    normalize_stats = _normalize.cache_info()
+    print(f"🔤 Normalize cache: {normalize_stats.hits} hits, {normalize_stats.misses} misses, {normalize_stats.currsize}/{normalize_stats.maxsize} entries")
+    if _persistent_parser_cache is not None:
+        stats = _persistent_parser_cache.stats()
+        print(f"🧠 LLM parse cache: {stats['hits']} hits, {stats['misses']} misses, {stats['entries']} entries ({stats['evictions']} evicted)")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Update Mealie recipe ingredients with optional LLM parsing.")
     parser.add_argument("--slugs", type=str, help="Comma-separated recipe slugs to process")
     parser.add_argument("--dry-run", action="store_true", help="Do not perform any API updates, just parse and report")
+    parser.add_argument("--resume", action="store_true", help="Skip recipes completed by the previous (interrupted) run")
+    parser.add_argument("--llm-workers", type=int, default=OPENROUTER_WORKERS, help=f"Concurrent OpenRouter requests in the LLM pre-pass (default: {OPENROUTER_WORKERS})")
     args = parser.parse_args()
 
     target_slugs = None
@@ -588,4 +898,4 @@ if __name__ == "__main__":
     elif os.getenv("TARGET_RECIPE_SLUGS"):
         target_slugs = set(s.strip() for s in os.getenv("TARGET_RECIPE_SLUGS").split(",") if s.strip())
 
-    process_recipe_updates(target_slugs, dry_run=args.dry_run)
+    process_recipe_updates(target_slugs, dry_run=args.dry_run, llm_workers=args.llm_workers, resume=args.resume)
@@ -1,21 +1,18 @@
 ﻿import requests
-import json
-import time
 import os
-from config import MEALIE_URL, HEADERS, MEALIE_VERIFY_SSL
+import argparse
+import http_client
+from backup_loader import load_backup
+from mapping_index import load_mapping_index, mappings_available
+from progress_journal import ProgressJournal, payload_hash
+from snapshot_store import fetch_recipes_by_slug
+from rate_limiter import AdaptiveRateLimiter
 
-# Disable SSL warnings for self-signed certificates only if verification is disabled
-import urllib3
-if not MEALIE_VERIFY_SSL:
-    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-
-# Configuration for robust connection handling
-MAX_RETRIES = 3
-REQUEST_TIMEOUT = 30
+# Paces recipe PATCHes; adapts to how fast Mealie responds
+RATE_LIMITER = AdaptiveRateLimiter()
 
 # Define file paths
 DATABASE_FILE = "database.json"
-MAPPINGS_FILE = "mappings.json"
 
 # Load old recipes and instructions from database.json
 def fetch_old_data():
@@ -23,91 +20,51 @@ def fetch_old_data():
         print("⚠️ database.json not found! Make sure to provide it.")
         return {}, {}
     
-    with open(DATABASE_FILE, "r", encoding="utf-8") as file:
-        data = json.load(file)
-    
-    recipes = {recipe["id"]: recipe for recipe in data.get("recipes", [])}
+    backup = load_backup(DATABASE_FILE, tables=("recipes", "recipe_instructions"))
     instructions = {}
-    
-    for instr in data.get("recipe_instructions", []):
-        if instr["recipe_id"] not in instructions:
-            instructions[instr["recipe_id"]] = []
-        instructions[instr["recipe_id"]].append({
+
+    for recipe_id, rows in backup.instructions_by_recipe_id.items():
+        instructions[recipe_id] = [{
             "id": instr.get("id", ""),
             "title": instr.get("title", ""),
             "summary": instr.get("summary", ""),
             "text": instr.get("text", ""),
             "ingredientReferences": instr.get("ingredientReferences", [])
-        })
-    
-    return recipes, instructions
+        } for instr in rows]
+
+    return backup.recipes_by_id, instructions
 
-# Load mappings.json
+# Load the recipe mappings
 def load_mappings():
-    if not os.path.exists(MAPPINGS_FILE):
-        print("⚠️ mappings.json not found! Make sure to provide it.")
+    if not mappings_available():
+        print("⚠️ No ID mappings found! Upload the recipes or run data_update_map.py first.")
         return {}
     
-    with open(MAPPINGS_FILE, "r", encoding="utf-8") as file:
-        return json.load(file).get("recipes", {})
-
-# Fetch all recipes from Mealie
-def fetch_all_recipes():
-    recipes = {}
-    page = 1
-    per_page = 100
-    
-    while True:
-        url = f"{MEALIE_URL}/api/recipes?page={page}&perPage={per_page}"
-        response = requests.get(url, headers=HEADERS, verify=MEALIE_VERIFY_SSL, timeout=REQUEST_TIMEOUT)
-        print(f"🔄 Fetching recipes: Page {page}, Status Code: {response.status_code}")
-        if response.status_code == 200:
-            try:
-                data = response.json()
-                items = data.get("items", [])
-                if not items:
-                    break
-                for recipe in items:
-                    recipes[recipe["slug"]] = recipe
-                page += 1
-            except requests.exceptions.JSONDecodeError:
-                print("❌ Error: Response is not valid JSON!")
-                break
-        else:
-            print(f"⚠️ Failed to fetch recipes: {response.text}")
-            break
-    return recipes
+    return load_mapping_index()["recipes"]
 
 # Update recipe instructions
 def update_recipe_instructions(recipe_slug, instructions):
-    url = f"{MEALIE_URL}/api/recipes/{recipe_slug}"
     payload = {"recipeInstructions": instructions}
 
-    for attempt in range(1, MAX_RETRIES + 1):
-        try:
-            print(f"🔍 Attempt {attempt}/{MAX_RETRIES}: Updating instructions for recipe {recipe_slug}")
-            response = requests.patch(url, headers=HEADERS, json=payload, verify=MEALIE_VERIFY_SSL, timeout=REQUEST_TIMEOUT)
-            if response.status_code == 200:
-                print(f"✅ Successfully updated instructions for recipe: {recipe_slug}")
-                return True
-            else:
-                print(f"❌ Failed to update instructions for recipe {recipe_slug} - {response.text}")
-                return False
-        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout, requests.exceptions.ReadTimeout) as e:
-            print(f"⚠️ Connection issue on attempt {attempt}: {e}")
-            if attempt < MAX_RETRIES:
-                wait_time = attempt * 2
-                print(f"⏳ Waiting {wait_time} seconds before retry...")
-                time.sleep(wait_time)
-            else:
-                print(f"❌ Failed to update instructions for recipe {recipe_slug} after {MAX_RETRIES} attempts")
-                return False
-        except Exception as e:
-            print(f"❌ Unexpected error updating instructions for recipe {recipe_slug}: {e}")
+    # Connection errors and transient 5xx/429 responses are retried by http_client
+    try:
+        print(f"🔍 Updating instructions for recipe {recipe_slug}")
+        response = http_client.patch(f"/api/recipes/{recipe_slug}", json=payload, limiter=RATE_LIMITER)
+        if response.status_code == 200:
+            print(f"✅ Successfully updated instructions for recipe: {recipe_slug}")
+            return True
+        else:
+            print(f"❌ Failed to update instructions for recipe {recipe_slug} - {response.text}")
             return False
+    except requests.exceptions.RequestException as e:
+        print(f"❌ Failed to update instructions for recipe {recipe_slug} after retries: {e}")
+        return False
+    except Exception as e:
+        print(f"❌ Unexpected error updating instructions for recipe {recipe_slug}: {e}")
+        return False
 
 # Main function to update all recipe instructions
-def main():
+def main(resume=False):
     print("🚀 Starting robust recipe instructions update...")
     old_recipes, old_instructions = fetch_old_data()
     mappings = load_mappings()
@@ -120,33 +77,62 @@ def main():
     processed = 0
     successful = 0
     failed = 0
+    resumed = 0
+
+    # Completed PATCHes are journaled so --resume can skip them after a crash
+    journal = ProgressJournal("instructions", resume=resume)
+    if resume:
+        print(f"⏩ Resuming: {journal.done_count()} recipes already done in the previous run")
     
     print(f"📊 Found {total_recipes} recipe mappings to process")
+
+    # Live recipes are PATCHed by slug; index them by id once
+    slugs_by_id = {recipe["id"]: slug for slug, recipe in fetch_recipes_by_slug().items()}
     
-    for recipe_name, mapping in mappings.items():
-        processed += 1
-        old_id = mapping.get("old_id")
-        new_id = mapping.get("new_id")
+    try:
+        for recipe_name, mapping in mappings.items():
+            processed += 1
+            old_id = mapping.get("old_id")
+            new_id = mapping.get("new_id")
         
-        print(f"📋 Progress: {processed}/{total_recipes} - Processing: {recipe_name}")
+            print(f"📋 Progress: {processed}/{total_recipes} - Processing: {recipe_name}")
         
-        if old_id:
-            try:
-                update_recipe_instructions(old_id, new_id, old_instructions)
+            if not old_id:
+                print(f"⚠️ No old ID found for recipe {recipe_name}, skipping")
+                failed += 1
+                continue
+
+            recipe_slug = slugs_by_id.get(new_id)
+            instructions = old_instructions.get(str(old_id))
+            if not recipe_slug:
+                print(f"⚠️ No recipe found in Mealie for {recipe_name}, skipping")
+                failed += 1
+            elif not instructions:
+                print(f"⚠️ No old instructions found for recipe {recipe_slug}")
+                failed += 1
+            elif journal.is_done(recipe_slug, payload_hash(instructions)):
+                print(f"⏩ Already updated in the previous run: {recipe_slug}")
+                resumed += 1
+            elif update_recipe_instructions(recipe_slug, instructions):
+                journal.record(recipe_slug, "done", payload_hash(instructions))
                 successful += 1
-                time.sleep(1)  # Small delay between requests
-            except Exception as e:
-                print(f"❌ Error processing recipe {recipe_name}: {e}")
+            else:
+                journal.record(recipe_slug, "failed", payload_hash(instructions))
                 failed += 1
-        else:
-            print(f"⚠️ No old ID found for recipe {recipe_name}, skipping")
-            failed += 1
+    finally:
+        # Also on errors/Ctrl+C, so batched records reach the disk for --resume
+        journal.close()
     
     print("\n🎉 Recipe instructions update completed!")
     print(f"📊 Final Results:")
     print(f"✅ Successful updates: {successful}")
     print(f"❌ Failed updates: {failed}")
+    if resume:
+        print(f"⏩ Skipped (done in previous run): {resumed}")
     print(f"📋 Total processed: {processed}")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Restore recipe instructions from the backup.")
+    parser.add_argument("--resume", action="store_true", help="Skip recipes completed by the previous (interrupted) run")
+    args = parser.parse_args()
+    main(resume=args.resume)
@@ -1,41 +1,35 @@
-﻿import requests
-import json
-import time
+﻿import json
 import os
-from config import MEALIE_URL, HEADERS, MEALIE_VERIFY_SSL
+import http_client
+from backup_loader import load_backup
+from mapping_index import load_mapping_index, mappings_available
+from snapshot_store import fetch_recipes_by_slug
+from rate_limiter import AdaptiveRateLimiter
 
-REQUEST_TIMEOUT = 30
-
-# Disable SSL warnings for self-signed certificates only if verification is disabled
-import urllib3
-if not MEALIE_VERIFY_SSL:
-    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+# Paces recipe PATCHes; adapts to how fast Mealie responds
+RATE_LIMITER = AdaptiveRateLimiter()
 
 # Define the database file path
 DATABASE_FILE = "database.json"
 
-# Load mappings from mappings.json
-MAPPINGS_FILE = "mappings.json"
-if os.path.exists(MAPPINGS_FILE):
-    with open(MAPPINGS_FILE, "r", encoding="utf-8") as file:
-        MAPPINGS = json.load(file)
-else:
-    print("⚠️ mappings.json not found. Make sure to run create-map.py first.")
-    exit(1)
+# Load mappings from the mapping store (on use, so this module can be imported before they exist)
+def get_mappings():
+    if not mappings_available():
+        print("⚠️ No ID mappings found. Make sure to run create-map.py first.")
+        exit(1)
+    return load_mapping_index()
 
 # Load old recipes, users, and nutrition data from database.json
 def fetch_old_data():
     if not os.path.exists(DATABASE_FILE):
         print("⚠️ database.json not found! Make sure to provide it.")
-        return [], [], {}
-
-    with open(DATABASE_FILE, "r", encoding="utf-8") as file:
-        data = json.load(file)
+        return {}, {}, {}
 
+    backup = load_backup(DATABASE_FILE, tables=("recipes", "users", "recipe_nutrition"))
     return (
-        data.get("recipes", []),
-        data.get("users", []),
-        {n["recipe_id"]: n for n in data.get("recipe_nutrition", [])}  # Map nutrition by old recipe_id
+        backup.recipes_by_slug,
+        backup.users_by_id,
+        backup.nutrition_by_recipe_id  # Map nutrition by old recipe_id
     )
 
 # Read-only fields that should not be updated
@@ -71,29 +65,32 @@ DEFAULT_VALUES = {
 
 # Map user ID from old database to new database using username (case-insensitive)
 def map_user_id(old_user_id, old_users):
-    old_user = next((user for user in old_users if user["id"] == old_user_id), None)
+    old_user = old_users.get(old_user_id)
     if old_user:
         username = old_user.get("username", "").lower()  # Normalize username to lowercase
-        if username and "users" in MAPPINGS:
-            user_mappings = {key.lower(): value["new_id"] for key, value in MAPPINGS["users"].items()}  # Extract only "new_id"
-            if username in user_mappings:
-                print(f"✅ Mapped user {username} → {user_mappings[username]}")
-                return user_mappings[username]
+        mappings = get_mappings()
+        if username and "users" in mappings:
+            user_mapping = mappings["users"].get(username)
+            if user_mapping is not None:
+                print(f"✅ Mapped user {username} → {user_mapping['new_id']}")
+                return user_mapping["new_id"]
         print(f"⚠️ No mapping found for username: {username}, keeping original user_id.")
     else:
         print(f"⚠️ No matching user found for user_id: {old_user_id}, keeping original.")
     return old_user_id  # Fallback to the old ID if no mapping is found
 
-# Map household ID if present in mappings.json
+# Map household ID if a households mapping was provided
 def map_household_id(old_household_id):
-    if "households" in MAPPINGS and old_household_id in MAPPINGS["households"]:
-        return MAPPINGS["households"][old_household_id]
+    new_household_id = get_mappings()["households"].new_id_for(old_household_id)
+    if new_household_id is not None:
+        return new_household_id
     print(f"⚠️ No mapping found for household_id: {old_household_id}, removing field from update.")
     return None  # Return None to exclude it from update payload
 
 # Map nutrition data from old database using recipe mapping
 def map_recipe_nutrition(recipe, old_nutrition):
-    old_recipe_id = MAPPINGS["recipes"].get(recipe["name"].lower(), {}).get("old_id")
+    # By ID: recipes that share a name each keep their own nutrition
+    old_recipe_id = get_mappings()["recipes"].old_id_for(recipe["id"])
     
     if not old_recipe_id or old_recipe_id not in old_nutrition:
         print(f"⚠️ No nutrition data found for {recipe['name']}, skipping.")
@@ -140,41 +137,9 @@ def update_missing_fields(recipe, old_recipe, old_users, old_nutrition):
 
     return updated_fields
 
-# Fetch all recipes from Mealie
-def fetch_all_recipes():
-    recipes = []
-    page = 1
-    per_page = 100
-
-    while True:
-        url = f"{MEALIE_URL}/api/recipes?page={page}&perPage={per_page}"
-        response = requests.get(url, headers=HEADERS, verify=MEALIE_VERIFY_SSL, timeout=REQUEST_TIMEOUT)
-
-        print(f"🔄 Fetching recipes: Page {page}, Status Code: {response.status_code}")
-
-        if response.status_code == 200:
-            try:
-                data = response.json()
-                items = data.get("items", [])
-
-                if not items:
-                    break
-
-                recipes.extend(items)
-                page += 1
-
-            except requests.exceptions.JSONDecodeError:
-                print("❌ Error: Response is not valid JSON!")
-                break
-        else:
-            print(f"⚠️ Failed to fetch recipes: {response.text}")
-            break
-
-    return recipes
-
 # Update a recipe in Mealie
 def update_recipe(recipe, old_recipes, old_users, old_nutrition):
-    old_recipe = next((r for r in old_recipes if r["slug"] == recipe["slug"]), None)
+    old_recipe = old_recipes.get(recipe["slug"])
     if not old_recipe:
         print(f"⚠️ No matching old recipe found for: {recipe['name']}")
         return
@@ -188,9 +153,8 @@ def update_recipe(recipe, old_recipes, old_users, old_nutrition):
         return
 
     recipe_slug = recipe["slug"]
-    url = f"{MEALIE_URL}/api/recipes/{recipe_slug}"
     print(f"🔍 Sending update with missing fields: {json.dumps(missing_fields, indent=2)}")
-    response = requests.patch(url, headers=HEADERS, json=missing_fields, verify=MEALIE_VERIFY_SSL, timeout=REQUEST_TIMEOUT)
+    response = http_client.patch(f"/api/recipes/{recipe_slug}", json=missing_fields, limiter=RATE_LIMITER)
 
     if response.status_code == 200:
         print(f"✅ Successfully updated recipe: {recipe['name']}")
@@ -199,16 +163,16 @@ def update_recipe(recipe, old_recipes, old_users, old_nutrition):
 
 # Main function to update all recipes
 def main():
-    recipes = fetch_all_recipes()
+    get_mappings()  # fail fast if there are no mappings yet
+    recipes = fetch_recipes_by_slug()
     old_recipes, old_users, old_nutrition = fetch_old_data()
 
     if not recipes:
         print("⚠️ No recipes found. Exiting.")
         return
 
-    for recipe in recipes:
+    for recipe in recipes.values():
         update_recipe(recipe, old_recipes, old_users, old_nutrition)
-        time.sleep(1)
 
     print("✅ Recipe update completed!")
 
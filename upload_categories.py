@@ -1,33 +1,27 @@
-﻿import json
-import requests
-from config import MEALIE_URL, HEADERS, MEALIE_VERIFY_SSL
+﻿import argparse
+from backup_loader import load_backup
+from bulk_upload import upload_entities, add_concurrency_argument, DEFAULT_CONCURRENCY
 
-# Disable SSL warnings for self-signed certificates only if verification is disabled
-import urllib3
-if not MEALIE_VERIFY_SSL:
-    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-
-REQUEST_TIMEOUT = 30
-
-# Load JSON data from the backup
 BACKUP_FILE = "database.json"  # Ensure this file is in the same folder
-with open(BACKUP_FILE, "r", encoding="utf-8") as file:
-    data = json.load(file)
 
-categories = data.get("categories", [])
 
-# Upload categories
-for category in categories:
-    payload = {
+def build_payload(category):
+    return {
         "name": category["name"]
     }
-    response = requests.post(f"{MEALIE_URL}/api/organizers/categories", json=payload, headers=HEADERS, verify=MEALIE_VERIFY_SSL, timeout=REQUEST_TIMEOUT)
-    
-    if response.status_code == 201:
-        print(f"✔ Successfully added category: {category['name']}")
-    elif response.status_code == 409:
-        print(f"⚠ Category already exists: {category['name']}")
-    else:
-        print(f"❌ Failed to add category: {category['name']} - {response.text}")
-
-print("Category upload completed!")
+
+
+def main(concurrency=DEFAULT_CONCURRENCY):
+    # Load JSON data from the backup
+    categories = load_backup(BACKUP_FILE, tables=("categories",)).table("categories")
+
+    # Upload categories
+    upload_entities(categories, "/api/organizers/categories", "category", build_payload, concurrency=concurrency, record_as="categories")
+
+    print("Category upload completed!")
+
+
+if __name__ == "__main__":
+    parser = add_concurrency_argument(argparse.ArgumentParser(description="Upload categories from database.json to Mealie."))
+    args = parser.parse_args()
+    main(args.concurrency)
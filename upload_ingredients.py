@@ -1,24 +1,12 @@
-﻿import json
-import requests
-from config import MEALIE_URL, HEADERS, MEALIE_VERIFY_SSL
+﻿import argparse
+from backup_loader import load_backup
+from bulk_upload import upload_entities, add_concurrency_argument, DEFAULT_CONCURRENCY
 
-# Disable SSL warnings for self-signed certificates only if verification is disabled
-import urllib3
-if not MEALIE_VERIFY_SSL:
-    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-
-# Load JSON data from the backup
 BACKUP_FILE = "database.json"  # Ensure this file is in the same folder
-with open(BACKUP_FILE, "r", encoding="utf-8") as file:
-    data = json.load(file)
-
-ingredients = data.get("ingredient_foods", [])
 
-REQUEST_TIMEOUT = 30
 
-# Upload ingredients
-for ingredient in ingredients:
-    payload = {
+def build_payload(ingredient):
+    return {
         "id": ingredient["id"],
         "name": ingredient["name"],
         "pluralName": ingredient.get("plural_name", ingredient["name"]),
@@ -27,12 +15,19 @@ for ingredient in ingredients:
         "extras": {},
         "aliases": []
     }
-    response = requests.post(f"{MEALIE_URL}/api/foods", json=payload, headers=HEADERS, verify=MEALIE_VERIFY_SSL, timeout=REQUEST_TIMEOUT)
-    if response.status_code == 201:
-        print(f"✔ Successfully added ingredient: {ingredient['name']}")
-    elif response.status_code == 409:
-        print(f"⚠ Ingredient already exists: {ingredient['name']}")
-    else:
-        print(f"❌ Failed to add ingredient: {ingredient['name']} - {response.text}")
-
-print("Ingredient upload completed!")
+
+
+def main(concurrency=DEFAULT_CONCURRENCY):
+    # Load JSON data from the backup
+    ingredients = load_backup(BACKUP_FILE, tables=("ingredient_foods",)).table("ingredient_foods")
+
+    # Upload ingredients
+    upload_entities(ingredients, "/api/foods", "ingredient", build_payload, concurrency=concurrency, record_as="foods")
+
+    print("Ingredient upload completed!")
+
+
+if __name__ == "__main__":
+    parser = add_concurrency_argument(argparse.ArgumentParser(description="Upload ingredient foods from database.json to Mealie."))
+    args = parser.parse_args()
+    main(args.concurrency)
@@ -1,55 +1,39 @@
-﻿import os
-import requests
-import json
+﻿import io
+import os
 import random
 import string
-from config import MEALIE_URL, HEADERS, MEALIE_VERIFY_SSL
+import http_client
+from backup_loader import load_backup
+from mapping_index import load_mapping_index, mappings_available
+from snapshot_store import fetch_recipe_slugs
 from PIL import Image
 from requests_toolbelt.multipart.encoder import MultipartEncoder
 
-# Disable SSL warnings for self-signed certificates only if verification is disabled
-import urllib3
-if not MEALIE_VERIFY_SSL:
-    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-
-# Load JSON data from the backup
 BACKUP_FILE = "database.json"
-MAPPINGS_FILE = "mappings.json"
 
-# Load mappings from mappings.json
-if os.path.exists(MAPPINGS_FILE):
-    with open(MAPPINGS_FILE, "r", encoding="utf-8") as file:
-        MAPPINGS = json.load(file)
-        print(f"🔍 Loaded recipe mappings: {len(MAPPINGS.get('recipes', {}))} entries")
+# Load mappings from the mapping store
+if mappings_available():
+    MAPPINGS = load_mapping_index()
+    print(f"🔍 Loaded recipe mappings: {len(MAPPINGS['recipes'])} entries")
 else:
-    print("⚠️ mappings.json not found. Make sure to run create-map.py first.")
+    print("⚠️ No ID mappings found. Upload the recipes or run data_update_map.py first.")
     exit(1)
 
 # Load old recipe data to map old ID to name (not slug)
 old_recipe_map = {}
 if os.path.exists(BACKUP_FILE):
-    with open(BACKUP_FILE, "r", encoding="utf-8") as file:
-        old_data = json.load(file)
-        for recipe in old_data.get("recipes", []):
-            old_recipe_map[recipe["id"]] = recipe["name"].lower()  # Use name instead of slug
+    for recipe in load_backup(BACKUP_FILE, tables=("recipes",)).table("recipes"):
+        old_recipe_map[recipe["id"]] = recipe["name"].lower()  # Use name instead of slug
 else:
     print("⚠️ database.json not found! Make sure to provide it.")
     exit(1)
 
-# Fetch new recipes from Mealie to map ID → slug
-recipe_map = {}
-REQUEST_TIMEOUT = 30
-response = requests.get(f"{MEALIE_URL}/api/recipes", headers=HEADERS, verify=MEALIE_VERIFY_SSL, timeout=REQUEST_TIMEOUT)
-if response.status_code == 200:
-    try:
-        for recipe in response.json().get("items", []):
-            recipe_map[recipe["id"]] = recipe["slug"]  # Correctly map ID to slug
-    except json.JSONDecodeError:
-        print("❌ Failed to parse JSON response from API")
-        exit(1)
-else:
-    print(f"❌ Failed to fetch recipes from Mealie API: {response.status_code}")
+# Fetch new recipes from Mealie to map ID → slug (via the local snapshot, only id/slug read)
+recipe_map = fetch_recipe_slugs()
+if not recipe_map:
+    print("❌ No recipes fetched from Mealie API")
     exit(1)
+print(f"🎯 Total recipes fetched: {len(recipe_map)}")
 
 # Define path to extracted images
 IMAGE_FOLDER = "data/recipes"  # Relative path from project root
@@ -57,13 +41,13 @@ IMAGE_FOLDER = "data/recipes"  # Relative path from project root
 # Allowed image formats (including webp)
 ALLOWED_IMAGE_FORMATS = ["jpg", "jpeg", "png", "gif", "webp"]
 
-# Convert webp to jpg
+# Convert webp to jpg in memory (returns the JPEG bytes)
 def convert_webp_to_jpg(webp_path):
-    jpg_path = webp_path.replace(".webp", ".jpg")
+    buffer = io.BytesIO()
     with Image.open(webp_path) as img:
         img = img.convert("RGB")
-        img.save(jpg_path, "JPEG")
-    return jpg_path
+        img.save(buffer, "JPEG")
+    return buffer.getvalue()
 
 # Generate a random string for file name
 def random_string(length=10):
@@ -72,11 +56,7 @@ def random_string(length=10):
 # Upload images
 for old_id, old_name in old_recipe_map.items():
     # Step 1: Get new recipe ID from mappings using the old_id instead of name
-    new_recipe_id = None
-    for recipe_name, mapping_data in MAPPINGS.get("recipes", {}).items():
-        if mapping_data.get("old_id") == old_id:
-            new_recipe_id = mapping_data.get("new_id")
-            break
+    new_recipe_id = MAPPINGS["recipes"].new_id_for(old_id)
     
     # Step 2: Use new recipe ID to get the slug
     new_slug = recipe_map.get(new_recipe_id, None)
@@ -88,3 +68,31 @@ for old_id, old_name in old_recipe_map.items():
     # Convert old_id to UUID format with hyphens (8-4-4-4-12)
     if len(old_id) == 32 and '-' not in old_id:
         old_id_with_hyphens = f"{old_id[:8]}-{old_id[8:12]}-{old_id[12:16]}-{old_id[16:20]}-{old_id[20:]}"
+    else:
+        old_id_with_hyphens = old_id
+
+    image_path = os.path.join(IMAGE_FOLDER, old_id_with_hyphens, "images", "original.webp")
+    if not os.path.exists(image_path):
+        print(f"⚠ No original.webp found for recipe: {new_slug}, skipping.")
+        continue
+
+    # Step 3: Convert to jpg and upload it under a random file name
+    try:
+        with io.BytesIO(convert_webp_to_jpg(image_path)) as img_file:
+            encoder = MultipartEncoder(
+                fields={
+                    "image": (random_string(10) + ".jpg", img_file, "image/jpeg"),
+                    "extension": "jpg"
+                }
+            )
+            response = http_client.put(
+                f"/api/recipes/{new_slug}/image",
+                data=encoder,
+                headers={"Content-Type": encoder.content_type},
+            )
+        if response.status_code == 200:
+            print(f"✔ Successfully uploaded image for recipe: {new_slug}")
+        else:
+            print(f"❌ Failed to upload image for recipe: {new_slug} - {response.status_code}: {response.text}")
+    except Exception as e:
+        print(f"❌ Failed to upload image for recipe: {new_slug} - {e}")
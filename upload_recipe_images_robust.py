@@ -1,109 +1,99 @@
+import hashlib
+import io
+import multiprocessing
 import os
+import argparse
+import queue
+import threading
 import requests
-import json
 import random
 import string
 import time
-from config import MEALIE_URL, HEADERS, MEALIE_VERIFY_SSL
+import urllib3
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+import http_client
+from backup_loader import load_backup
+from image_manifest import ImageManifest
+from mapping_index import load_mapping_index, mappings_available
+from progress_journal import ProgressJournal, payload_hash
+from snapshot_store import fetch_recipe_slugs
+from rate_limiter import AdaptiveRateLimiter
+from config import IMAGE_CONVERT_WORKERS, IMAGE_UPLOAD_WORKERS, IMAGE_QUEUE_SIZE, IMAGE_MAX_BUFFERS
 from PIL import Image
 from requests_toolbelt.multipart.encoder import MultipartEncoder
 
-# Disable SSL warnings for self-signed certificates only if verification is disabled
-import urllib3
-if not MEALIE_VERIFY_SSL:
-    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-
 # Configuration for robust uploading
 MAX_RETRIES = 3
 RETRY_DELAY = 2  # seconds
-REQUEST_TIMEOUT = 30  # seconds
-DELAY_BETWEEN_UPLOADS = 1  # seconds
 
-# Load JSON data from the backup
+# Where Mealie serves a recipe's current image (used by --verify-server)
+SERVER_IMAGE_PATH = "/api/media/recipes/{recipe_id}/images/original.webp"
+
+# Paces uploads instead of a fixed delay; backs off when the server struggles
+RATE_LIMITER = AdaptiveRateLimiter()
+
 BACKUP_FILE = "database.json"
-MAPPINGS_FILE = "mappings.json"
 
 def load_mappings():
-    """Load mappings from mappings.json"""
-    if os.path.exists(MAPPINGS_FILE):
-        with open(MAPPINGS_FILE, "r", encoding="utf-8") as file:
-            mappings = json.load(file)
-            print(f"🔍 Loaded recipe mappings: {len(mappings.get('recipes', {}))} entries")
-            return mappings
+    """Load mappings from the mapping store"""
+    if mappings_available():
+        mappings = load_mapping_index()
+        print(f"🔍 Loaded recipe mappings: {len(mappings['recipes'])} entries")
+        return mappings
     else:
-        print("⚠️ mappings.json not found. Make sure to run create-map.py first.")
+        print("⚠️ No ID mappings found. Upload the recipes or run data_update_map.py first.")
         exit(1)
 
 def load_old_recipes():
     """Load old recipe data to map old ID to name"""
     old_recipe_map = {}
     if os.path.exists(BACKUP_FILE):
-        with open(BACKUP_FILE, "r", encoding="utf-8") as file:
-            old_data = json.load(file)
-            for recipe in old_data.get("recipes", []):
-                old_recipe_map[recipe["id"]] = recipe["name"].lower()
-            print(f"📚 Loaded {len(old_recipe_map)} old recipes")
-            return old_recipe_map
+        for recipe in load_backup(BACKUP_FILE, tables=("recipes",)).table("recipes"):
+            old_recipe_map[recipe["id"]] = recipe["name"].lower()
+        print(f"📚 Loaded {len(old_recipe_map)} old recipes")
+        return old_recipe_map
     else:
         print("⚠️ database.json not found! Make sure to provide it.")
         exit(1)
 
 def fetch_new_recipes():
     """Fetch new recipes from Mealie to map ID → slug"""
-    recipe_map = {}
-    page = 1
-    per_page = 100
-    
-    while True:
-        try:
-            response = requests.get(
-                f"{MEALIE_URL}/api/recipes?page={page}&perPage={per_page}", 
-                headers=HEADERS, 
-                verify=MEALIE_VERIFY_SSL,
-                timeout=REQUEST_TIMEOUT
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                items = data.get("items", [])
-                
-                if not items:
-                    break
-                    
-                for recipe in items:
-                    recipe_map[recipe["id"]] = recipe["slug"]
-                
-                page += 1
-                print(f"📡 Fetched page {page-1} with {len(items)} recipes")
-                
-            else:
-                print(f"❌ Failed to fetch recipes from Mealie API: {response.status_code}")
-                break
-                
-        except requests.exceptions.RequestException as e:
-            print(f"❌ Error fetching recipes: {e}")
-            break
-    
+    recipe_map = fetch_recipe_slugs()
     print(f"🎯 Total recipes fetched: {len(recipe_map)}")
     return recipe_map
 
 def convert_webp_to_jpg(webp_path):
-    """Convert webp to jpg"""
-    jpg_path = webp_path.replace(".webp", ".jpg")
+    """Convert webp to jpg in memory; returns the JPEG bytes (nothing is written next to the backup)"""
     try:
+        buffer = io.BytesIO()
         with Image.open(webp_path) as img:
             img = img.convert("RGB")
-            img.save(jpg_path, "JPEG", quality=90)
-        return jpg_path
+            img.save(buffer, "JPEG", quality=90)
+        return buffer.getvalue()
     except Exception as e:
         print(f"❌ Error converting WebP to JPG: {e}")
         return None
 
+def convert_image_file(image_path):
+    """Read the source image once; returns (source sha256, JPEG bytes or None)"""
+    with open(image_path, "rb") as source:
+        raw = source.read()
+    return hashlib.sha256(raw).hexdigest(), convert_webp_to_jpg(io.BytesIO(raw))
+
+def fetch_server_image_info(recipe_id):
+    """Read the headers of the recipe's image on the server; returns (status, etag, size)"""
+    # Mealie's image route does not answer HEAD, so GET it streamed and close before the body is read
+    with http_client.get(SERVER_IMAGE_PATH.format(recipe_id=recipe_id), limiter=RATE_LIMITER, stream=True) as response:
+        if response.status_code != 200:
+            return response.status_code, None, None
+        size = response.headers.get("Content-Length")
+        return response.status_code, response.headers.get("ETag"), int(size) if size else None
+
 def random_string(length=10):
     """Generate a random string for file name"""
     return ''.join(random.choices(string.ascii_letters + string.digits, k=length))
 
-def upload_image_with_retry(new_slug, image_path, max_retries=MAX_RETRIES):
+def upload_image_with_retry(new_slug, image_data, max_retries=MAX_RETRIES):
     """Upload image with retry logic"""
     file_extension = "jpg"
     random_filename = random_string(10)
@@ -112,22 +102,20 @@ def upload_image_with_retry(new_slug, image_path, max_retries=MAX_RETRIES):
         try:
             print(f"🔍 Attempt {attempt + 1}/{max_retries}: Uploading image for {new_slug}")
             
-            with open(image_path, "rb") as img_file:
+            # A fresh stream per attempt; the encoder reads the JPEG straight from memory
+            with io.BytesIO(image_data) as img_file:
                 encoder = MultipartEncoder(
                     fields={
                         "image": (random_filename + ".jpg", img_file, "image/jpeg"),
                         "extension": file_extension
                     }
                 )
-                headers = HEADERS.copy()
-                headers["Content-Type"] = encoder.content_type
-                
-                response = requests.put(
-                    f"{MEALIE_URL}/api/recipes/{new_slug}/image",
+                # Session headers carry auth; only the multipart content type is overridden
+                response = http_client.put(
+                    f"/api/recipes/{new_slug}/image",
                     data=encoder,
-                    headers=headers,
-                    verify=MEALIE_VERIFY_SSL,
-                    timeout=REQUEST_TIMEOUT
+                    headers={"Content-Type": encoder.content_type},
+                    limiter=RATE_LIMITER,
                 )
                 
                 print(f"📥 Response: {response.status_code}")
@@ -154,35 +142,13 @@ def upload_image_with_retry(new_slug, image_path, max_retries=MAX_RETRIES):
     print(f"❌ Failed to upload image for {new_slug} after {max_retries} attempts")
     return False
 
-def main():
-    """Main function to upload all recipe images"""
-    print("🚀 Starting robust recipe image upload...")
-    
-    # Load data
-    mappings = load_mappings()
-    old_recipe_map = load_old_recipes()
-    recipe_map = fetch_new_recipes()
-    
-    # Define path to extracted images
-    IMAGE_FOLDER = "data/recipes"
-    
-    # Track progress
-    total_recipes = len(old_recipe_map)
-    successful_uploads = 0
-    failed_uploads = 0
+def plan_uploads(mappings, old_recipe_map, recipe_map, image_folder):
+    """Resolve every old recipe to (new_slug, original.webp path, new recipe id); returns (jobs, skipped)"""
+    jobs = []
     skipped_recipes = 0
-    
-    print(f"🎯 Processing {total_recipes} recipes...")
-    
-    for i, (old_id, old_name) in enumerate(old_recipe_map.items(), 1):
-        print(f"\n📋 Progress: {i}/{total_recipes} - Processing: {old_name}")
-        
+    for old_id, old_name in old_recipe_map.items():
         # Step 1: Get new recipe ID from mappings using the old_id
-        new_recipe_id = None
-        for recipe_name, mapping_data in mappings.get("recipes", {}).items():
-            if mapping_data.get("old_id") == old_id:
-                new_recipe_id = mapping_data.get("new_id")
-                break
+        new_recipe_id = mappings["recipes"].new_id_for(old_id)
         
         # Step 2: Use new recipe ID to get the slug
         new_slug = recipe_map.get(new_recipe_id, None)
@@ -198,7 +164,7 @@ def main():
         else:
             old_id_with_hyphens = old_id
         
-        recipe_image_path = os.path.join(IMAGE_FOLDER, old_id_with_hyphens, "images")
+        recipe_image_path = os.path.join(image_folder, old_id_with_hyphens, "images")
         if not os.path.exists(recipe_image_path):
             print(f"⚠️ No images found for recipe: {new_slug}")
             skipped_recipes += 1
@@ -209,37 +175,201 @@ def main():
             print(f"⚠️ No original.webp found for recipe: {new_slug}, skipping.")
             skipped_recipes += 1
             continue
-        
-        # Convert webp to jpg
-        converted_image_path = convert_webp_to_jpg(image_path)
-        if not converted_image_path:
-            print(f"❌ Failed to convert image for recipe: {new_slug}")
-            failed_uploads += 1
-            continue
-        
-        # Upload with retry logic
-        if upload_image_with_retry(new_slug, converted_image_path):
-            successful_uploads += 1
-        else:
-            failed_uploads += 1
-        
-        # Cleanup converted file
+
+        jobs.append((new_slug, image_path, new_recipe_id))
+    return jobs, skipped_recipes
+
+def _server_has_image(entry, recipe_id):
+    """The server still serves the image we uploaded (same etag/size when those were recorded)"""
+    try:
+        status, etag, size = fetch_server_image_info(recipe_id)
+    except requests.exceptions.RequestException:
+        return False
+    if status != 200:
+        return False
+    if entry["server_etag"] and etag:
+        return etag == entry["server_etag"]
+    if entry["server_size"] is not None and size is not None:
+        return size == entry["server_size"]
+    return True
+
+def filter_unchanged(jobs, manifest, verify_server=False, workers=IMAGE_UPLOAD_WORKERS):
+    """Drop jobs whose source image was already uploaded; returns (jobs, unchanged)"""
+    current = [manifest.is_current(new_slug, image_path, recipe_id) for new_slug, image_path, recipe_id in jobs]
+    if verify_server:
+        checks = [(job, manifest.get(job[0])) for job, is_current in zip(jobs, current) if is_current]
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            on_server = dict(zip(
+                (job[0] for job, _ in checks),
+                executor.map(lambda check: _server_has_image(check[1], check[0][2]), checks),
+            ))
+        for new_slug, verified in on_server.items():
+            if not verified:
+                print(f"🔎 Image for {new_slug} changed or missing on the server, uploading again")
+        current = [is_current and on_server.get(job[0], False) for job, is_current in zip(jobs, current)]
+    remaining = [job for job, is_current in zip(jobs, current) if not is_current]
+    return remaining, len(jobs) - len(remaining)
+
+def _record_upload(manifest, verify_server, new_slug, image_path, recipe_id, source_hash, image_data):
+    server_etag = server_size = None
+    if verify_server:
+        # Remember what the server now serves, to detect later replacements/deletions
+        try:
+            _, server_etag, server_size = fetch_server_image_info(recipe_id)
+        except requests.exceptions.RequestException:
+            pass
+    manifest.record_upload(
+        new_slug, recipe_id, image_path, source_hash, hashlib.sha256(image_data).hexdigest(),
+        server_etag=server_etag, server_size=server_size,
+    )
+
+def _job_hash(job):
+    new_slug, image_path, recipe_id = job
+    return payload_hash([image_path, recipe_id])
+
+def _upload_worker(upload_queue, buffers, counts, counts_lock, total, manifest, verify_server, journal):
+    """Upload converted images from the queue until a None sentinel arrives"""
+    while True:
+        job = upload_queue.get()
+        if job is None:
+            return
+        (new_slug, image_path, recipe_id), source_hash, image_data = job
         try:
-            if os.path.exists(converted_image_path):
-                os.remove(converted_image_path)
+            uploaded = upload_image_with_retry(new_slug, image_data)
+            if uploaded and manifest is not None:
+                _record_upload(manifest, verify_server, new_slug, image_path, recipe_id, source_hash, image_data)
         except Exception as e:
-            print(f"⚠️ Failed to cleanup converted file: {e}")
-        
-        # Add delay between uploads to be gentle on the server
-        if i < total_recipes:
-            time.sleep(DELAY_BETWEEN_UPLOADS)
+            print(f"❌ Unexpected error uploading image for {new_slug}: {e}")
+            uploaded = False
+        finally:
+            # Drop the buffer before waiting for the next job
+            image_data = None
+            buffers.release()
+        if journal is not None:
+            journal.record(new_slug, "done" if uploaded else "failed", _job_hash(job[0]))
+        with counts_lock:
+            counts["successful" if uploaded else "failed"] += 1
+            done = counts["successful"] + counts["failed"]
+        print(f"📋 Progress: {done}/{total}")
+
+def run_pipeline(jobs, convert_workers=IMAGE_CONVERT_WORKERS, upload_workers=IMAGE_UPLOAD_WORKERS, queue_size=IMAGE_QUEUE_SIZE, max_buffers=IMAGE_MAX_BUFFERS, manifest=None, verify_server=False, journal=None):
+    """
+    Convert images in a process pool and upload them from a thread pool.
+
+    Converted images pass through a bounded queue: when the uploaders fall
+    behind, conversion pauses instead of piling up JPEGs. At most
+    `max_buffers` images (converting, queued or uploading) are held in
+    memory at once; 0 means no cap beyond the queue. Successful uploads are
+    recorded in `manifest` and every outcome in `journal` when given.
+    Returns a dict of successful/failed counts.
+    """
+    counts = {"successful": 0, "failed": 0}
+    counts_lock = threading.Lock()
+    upload_queue = queue.Queue(maxsize=max(1, queue_size))
+    convert_workers = max(1, convert_workers)
+    upload_workers = max(1, upload_workers)
+    buffers = threading.Semaphore(max_buffers if max_buffers > 0 else max(1, len(jobs)))
+
+    with ThreadPoolExecutor(max_workers=upload_workers) as uploaders:
+        workers = [
+            uploaders.submit(_upload_worker, upload_queue, buffers, counts, counts_lock, len(jobs), manifest, verify_server, journal)
+            for _ in range(upload_workers)
+        ]
+        try:
+            # Spawned rather than forked: the pipeline may run next to other threads
+            # (restore.py), and forking a multi-threaded process can deadlock the children
+            with ProcessPoolExecutor(max_workers=convert_workers, mp_context=multiprocessing.get_context("spawn")) as converters:
+                pending = {}
+                remaining = iter(jobs)
+                next_job = next(remaining, None)
+                while True:
+                    # Keep every converter busy plus one job queued each
+                    while next_job is not None and len(pending) < convert_workers * 2:
+                        # Only wait for a free buffer when nothing is converting; otherwise
+                        # finished conversions must be handed on first to free buffers
+                        if not buffers.acquire(blocking=not pending):
+                            break
+                        pending[converters.submit(convert_image_file, next_job[1])] = next_job
+                        next_job = next(remaining, None)
+                    if not pending:
+                        break
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        job = pending.pop(future)
+                        new_slug = job[0]
+                        try:
+                            source_hash, image_data = future.result()
+                        except Exception as e:
+                            print(f"❌ Error converting WebP to JPG: {e}")
+                            image_data = None
+                        if not image_data:
+                            buffers.release()
+                            print(f"❌ Failed to convert image for recipe: {new_slug}")
+                            if journal is not None:
+                                journal.record(new_slug, "failed", _job_hash(job))
+                            with counts_lock:
+                                counts["failed"] += 1
+                            continue
+                        # Blocks while the queue is full (backpressure on conversion)
+                        upload_queue.put((job, source_hash, image_data))
+        finally:
+            for _ in workers:
+                upload_queue.put(None)
+        for worker in workers:
+            worker.result()
+
+    return counts
+
+def main(convert_workers=IMAGE_CONVERT_WORKERS, upload_workers=IMAGE_UPLOAD_WORKERS, force=False, verify_server=False, resume=False):
+    """Main function to upload all recipe images"""
+    print("🚀 Starting robust recipe image upload...")
+    
+    # Load data
+    mappings = load_mappings()
+    old_recipe_map = load_old_recipes()
+    recipe_map = fetch_new_recipes()
+    
+    # Define path to extracted images
+    IMAGE_FOLDER = "data/recipes"
+    
+    jobs, skipped_recipes = plan_uploads(mappings, old_recipe_map, recipe_map, IMAGE_FOLDER)
+    # Outcomes of this run are journaled so --resume can skip finished recipes after a crash
+    journal = ProgressJournal("images", resume=resume)
+    resumed = 0
+    if resume:
+        before = len(jobs)
+        jobs = [job for job in jobs if not journal.is_done(job[0], _job_hash(job))]
+        resumed = before - len(jobs)
+        print(f"⏩ Resuming: skipping {resumed} images uploaded in the previous run")
+    manifest = ImageManifest()
+    unchanged = 0
+    if not force:
+        jobs, unchanged = filter_unchanged(jobs, manifest, verify_server, upload_workers)
+    print(f"🎯 Processing {len(jobs)} images ({convert_workers} converters, {upload_workers} uploaders)...")
+    try:
+        counts = run_pipeline(jobs, convert_workers, upload_workers, manifest=manifest, verify_server=verify_server, journal=journal)
+    finally:
+        journal.close()
+        manifest.close()
+    successful_uploads = counts["successful"]
+    failed_uploads = counts["failed"]
     
     # Final summary
     print(f"\n🎉 Upload completed!")
     print(f"✅ Successful uploads: {successful_uploads}")
     print(f"❌ Failed uploads: {failed_uploads}")
+    print(f"⏭️ Unchanged since last upload: {unchanged}")
+    if resume:
+        print(f"⏩ Skipped (done in previous run): {resumed}")
     print(f"⚠️ Skipped recipes: {skipped_recipes}")
-    print(f"📊 Total processed: {successful_uploads + failed_uploads + skipped_recipes}")
+    print(f"📊 Total processed: {successful_uploads + failed_uploads + unchanged + resumed + skipped_recipes}")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Upload recipe images from the backup to Mealie.")
+    parser.add_argument("--convert-workers", type=int, default=IMAGE_CONVERT_WORKERS, help=f"Processes converting WebP to JPEG (default: {IMAGE_CONVERT_WORKERS})")
+    parser.add_argument("--upload-workers", type=int, default=IMAGE_UPLOAD_WORKERS, help=f"Concurrent image uploads (default: {IMAGE_UPLOAD_WORKERS})")
+    parser.add_argument("--resume", action="store_true", help="Skip recipes completed by the previous (interrupted) run")
+    parser.add_argument("--force", action="store_true", help="Upload every image, even if the manifest says it is unchanged")
+    parser.add_argument("--verify-server", action="store_true", help="Also check the server's current image (etag/size) before skipping a recipe")
+    args = parser.parse_args()
+    main(args.convert_workers, args.upload_workers, force=args.force, verify_server=args.verify_server, resume=args.resume)
@@ -1,40 +1,58 @@
-﻿import json
-import requests
-import time
-from config import MEALIE_URL, HEADERS, MEALIE_VERIFY_SSL
+﻿import requests
+import http_client
+from backup_loader import load_backup
+from bulk_upload import resolve_new_id
+from mapping_store import get_mapping_store
+from rate_limiter import AdaptiveRateLimiter
 
-REQUEST_TIMEOUT = 30
-
-# Disable SSL warnings for self-signed certificates only if verification is disabled
-import urllib3
-if not MEALIE_VERIFY_SSL:
-    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-
-# Load JSON data from the backup
 BACKUP_FILE = "database.json"
-with open(BACKUP_FILE, "r", encoding="utf-8") as file:
-    data = json.load(file)
-
-recipes = data.get("recipes", [])
-
-# Store recipe mappings
-created_recipes = {}
-
-# Step 1: Upload recipes
-for recipe in recipes:
-    payload = {"name": recipe["name"]}
-    response = requests.post(f"{MEALIE_URL}/api/recipes", json=payload, headers=HEADERS, verify=MEALIE_VERIFY_SSL, timeout=REQUEST_TIMEOUT)
-
-    if response.status_code == 201:
-        recipe_slug = response.json()
-        created_recipes[recipe["id"]] = recipe_slug
-        print(f"✔ Successfully created recipe: {recipe['name']} ({recipe_slug})")
-    elif response.status_code == 409:
-        print(f"⚠ Recipe already exists: {recipe['name']}")
-    else:
-        print(f"❌ Failed to create recipe: {recipe['name']} - {response.text}")
-
-    # Small delay to prevent API rate limits
-    time.sleep(1)
 
-print("Recipe creation completed!")
+# Paces recipe creation; speeds up while Mealie answers quickly, backs off on 429/5xx
+RATE_LIMITER = AdaptiveRateLimiter()
+
+
+# Look up the ID of a just-created recipe (the create call only returns its slug)
+def fetch_recipe_id(slug):
+    try:
+        response = http_client.get(f"/api/recipes/{slug}", limiter=RATE_LIMITER)
+    except requests.exceptions.RequestException as e:
+        print(f"⚠️ Could not look up ID of recipe {slug}: {e}")
+        return None
+    if response.status_code != 200:
+        print(f"⚠️ Could not look up ID of recipe {slug}: {response.status_code}")
+        return None
+    return response.json().get("id")
+
+
+def main():
+    # Load JSON data from the backup
+    recipes = load_backup(BACKUP_FILE, tables=("recipes",)).table("recipes")
+
+    # Store recipe mappings
+    created_recipes = {}
+    # Backup ID -> new ID/slug per recipe, stored as each recipe is created
+    store = get_mapping_store()
+
+    # Step 1: Upload recipes
+    for recipe in recipes:
+        payload = {"name": recipe["name"]}
+        response = http_client.post("/api/recipes", json=payload, limiter=RATE_LIMITER)
+
+        if response.status_code == 201:
+            recipe_slug = response.json()
+            created_recipes[recipe["id"]] = recipe_slug
+            print(f"✔ Successfully created recipe: {recipe['name']} ({recipe_slug})")
+            store.record("recipes", recipe["name"], recipe["id"], fetch_recipe_id(recipe_slug), slug=recipe_slug)
+        elif response.status_code == 409:
+            print(f"⚠ Recipe already exists: {recipe['name']}")
+            store.record("recipes", recipe["name"], recipe["id"], resolve_new_id("/api/recipes", response, "name", recipe["name"], limiter=RATE_LIMITER))
+        else:
+            print(f"❌ Failed to create recipe: {recipe['name']} - {response.text}")
+            store.record("recipes", recipe["name"], recipe["id"], None)
+
+    print("Recipe creation completed!")
+    return created_recipes
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,27 @@
-﻿import json
-import requests
-from config import MEALIE_URL, HEADERS, MEALIE_VERIFY_SSL
+﻿import argparse
+from backup_loader import load_backup
+from bulk_upload import upload_entities, add_concurrency_argument, DEFAULT_CONCURRENCY
 
-# Load JSON data from the backup
 BACKUP_FILE = "database.json"  # Ensure this file is in the same folder
-with open(BACKUP_FILE, "r", encoding="utf-8") as file:
-    data = json.load(file)
 
-tags = data.get("tags", [])
 
-# Upload tags
-for tag in tags:
-    payload = {
+def build_payload(tag):
+    return {
         "name": tag["name"]
     }
-    response = requests.post(f"{MEALIE_URL}/api/organizers/tags", json=payload, headers=HEADERS, verify=MEALIE_VERIFY_SSL)
-    
-    if response.status_code == 201:
-        print(f"✔ Successfully added tag: {tag['name']}")
-    elif response.status_code == 409:
-        print(f"⚠ Tag already exists: {tag['name']}")
-    else:
-        print(f"❌ Failed to add tag: {tag['name']} - {response.text}")
-
-print("Tag upload completed!")
+
+
+def main(concurrency=DEFAULT_CONCURRENCY):
+    # Load JSON data from the backup
+    tags = load_backup(BACKUP_FILE, tables=("tags",)).table("tags")
+
+    # Upload tags
+    upload_entities(tags, "/api/organizers/tags", "tag", build_payload, concurrency=concurrency, record_as="tags")
+
+    print("Tag upload completed!")
+
+
+if __name__ == "__main__":
+    parser = add_concurrency_argument(argparse.ArgumentParser(description="Upload tags from database.json to Mealie."))
+    args = parser.parse_args()
+    main(args.concurrency)
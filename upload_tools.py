@@ -1,27 +1,28 @@
-﻿import json
-import requests
-from config import MEALIE_URL, HEADERS, MEALIE_VERIFY_SSL
+﻿import argparse
+from backup_loader import load_backup
+from bulk_upload import upload_entities, add_concurrency_argument, DEFAULT_CONCURRENCY
 
-# Load JSON data from the backup
 BACKUP_FILE = "database.json"  # Ensure this file is in the same folder
-with open(BACKUP_FILE, "r", encoding="utf-8") as file:
-    data = json.load(file)
 
-tools = data.get("tools", [])
 
-# Upload tools
-for tool in tools:
-    payload = {
+def build_payload(tool):
+    return {
         "name": tool["name"],
         "householdsWithTool": []
     }
-    response = requests.post(f"{MEALIE_URL}/api/organizers/tools", json=payload, headers=HEADERS, verify=MEALIE_VERIFY_SSL)
-    
-    if response.status_code == 201:
-        print(f"✔ Successfully added tool: {tool['name']}")
-    elif response.status_code == 409:
-        print(f"⚠ Tool already exists: {tool['name']}")
-    else:
-        print(f"❌ Failed to add tool: {tool['name']} - {response.text}")
-
-print("Tool upload completed!")
+
+
+def main(concurrency=DEFAULT_CONCURRENCY):
+    # Load JSON data from the backup
+    tools = load_backup(BACKUP_FILE, tables=("tools",)).table("tools")
+
+    # Upload tools
+    upload_entities(tools, "/api/organizers/tools", "tool", build_payload, concurrency=concurrency, record_as="tools")
+
+    print("Tool upload completed!")
+
+
+if __name__ == "__main__":
+    parser = add_concurrency_argument(argparse.ArgumentParser(description="Upload tools from database.json to Mealie."))
+    args = parser.parse_args()
+    main(args.concurrency)
@@ -1,17 +1,12 @@
-﻿import json
-import requests
-from config import MEALIE_URL, HEADERS, MEALIE_VERIFY_SSL
+﻿import argparse
+from backup_loader import load_backup
+from bulk_upload import upload_entities, add_concurrency_argument, DEFAULT_CONCURRENCY
 
-# Load JSON data from the backup
 BACKUP_FILE = "database.json"  # Ensure this file is in the same folder
-with open(BACKUP_FILE, "r", encoding="utf-8") as file:
-    data = json.load(file)
 
-units = data.get("ingredient_units", [])
 
-# Upload ingredient units
-for unit in units:
-    payload = {
+def build_payload(unit):
+    return {
         "id": unit["id"],
         "name": unit["name"],
         "pluralName": unit.get("plural_name", unit["name"]),
@@ -23,13 +18,19 @@ for unit in units:
         "extras": {},
         "aliases": []
     }
-    response = requests.post(f"{MEALIE_URL}/api/units", json=payload, headers=HEADERS, verify=MEALIE_VERIFY_SSL)
-    if response.status_code == 201:
-        print(f"✔ Successfully added unit: {unit['name']}")
-    elif response.status_code == 409:
-        print(f"⚠ Unit already exists: {unit['name']}")
-    else:
-        print(f"❌ Failed to add unit: {unit['name']} - {response.text}")
 
-print("Ingredient units upload completed!")
 
+def main(concurrency=DEFAULT_CONCURRENCY):
+    # Load JSON data from the backup
+    units = load_backup(BACKUP_FILE, tables=("ingredient_units",)).table("ingredient_units")
+
+    # Upload ingredient units
+    upload_entities(units, "/api/units", "unit", build_payload, concurrency=concurrency, record_as="units")
+
+    print("Ingredient units upload completed!")
+
+
+if __name__ == "__main__":
+    parser = add_concurrency_argument(argparse.ArgumentParser(description="Upload ingredient units from database.json to Mealie."))
+    args = parser.parse_args()
+    main(args.concurrency)